@@ -0,0 +1,167 @@
+# This script contains the spatial clustering of access points. Access points
+# with the same SSID which are located within a given distance of each other
+# (directly or via other members) are collapsed into one cluster, e.g. the
+# access points of an enterprise or mesh network.
+#
+# The positions are projected to meters and assigned to the cells of a grid
+# with the cell size of the distance. Candidate pairs are only searched in
+# the same and in the neighbouring cells, which is done with sorted NumPy
+# arrays and binary search in batches, so no all-pairs comparison is needed.
+#
+# @author Christoph Bless
+#
+import math
+
+import numpy as np
+
+from kismetanalyzer import geo
+from kismetanalyzer.clientclusters import UnionFind
+from kismetanalyzer.model import AccessPointCluster
+
+
+# meters per degree (mean earth radius of 6371 km)
+_METERS_PER_DEGREE = math.pi / 180 * 6371000.0
+
+# usable bits of the int64 cell keys
+_KEY_BITS = 62
+
+
+def get_positions(aps):
+    """
+    Returns the positions of the access points projected to meters
+    (equirectangular projection) and a mask of the access points with
+    location.
+
+    :param aps: list of instances of kismetanalyzer.model.AccessPoint
+
+    :return: tuple of numpy arrays (x, y, valid)
+    """
+    coords = np.array([geo.get_coordinates(ap) for ap in aps], dtype=np.float64).reshape(-1, 2)
+    lon, lat = coords[:, 0], coords[:, 1]
+    valid = (lon != 0) | (lat != 0)
+    x = lon * _METERS_PER_DEGREE * np.cos(np.radians(lat))
+    y = lat * _METERS_PER_DEGREE
+    return x, y, valid
+
+
+def _neighbour_pairs(skey, offset, max_pairs):
+    """
+    Yields the pairs of positions (i, j) in the sorted key array where the
+    key of j equals the key of i plus the offset. For offset 0 only pairs
+    with i < j are returned. The pairs are returned in batches of about
+    max_pairs.
+    """
+    n = len(skey)
+    if offset == 0:
+        lo = np.arange(1, n + 1)
+        hi = np.searchsorted(skey, skey, side="right")
+    else:
+        target = skey + offset
+        lo = np.searchsorted(skey, target, side="left")
+        hi = np.searchsorted(skey, target, side="right")
+    counts = np.maximum(hi - lo, 0)
+    cum = np.cumsum(counts)
+
+    start = 0
+    while start < n:
+        before = cum[start - 1] if start else 0
+        end = max(int(np.searchsorted(cum, before + max_pairs, side="right")), start + 1)
+        c = counts[start:end]
+        total = int(c.sum())
+        if total:
+            src = np.repeat(np.arange(start, end), c)
+            first = np.repeat(lo[start:end], c)
+            # position of each pair within the range of its source
+            pos = np.arange(total) - np.repeat(np.cumsum(c) - c, c)
+            yield src, first + pos
+        start = end
+
+
+def find_clusters(aps, distance, max_pairs=1000000):
+    """
+    Group access points with the same (non empty) SSID which are located
+    within the given distance of each other. Access points without location
+    or SSID are not clustered.
+
+    :param aps: list of instances of kismetanalyzer.model.AccessPoint
+    :param distance: maximum distance in meters
+    :param max_pairs: number of candidate pairs which are compared at once
+
+    :return: list of clusters, each cluster is a list of indexes into aps
+    :raises ValueError: if the distance is not positive or too small for the
+                        extent of the capture
+    """
+    if distance <= 0:
+        raise ValueError("the distance must be greater than 0")
+
+    n = len(aps)
+    uf = UnionFind(n)
+    x, y, valid = get_positions(aps)
+    ssids = np.array([ap.ssid or "" for ap in aps], dtype=object)
+    candidates = np.nonzero(valid & (ssids != ""))[0]
+
+    if len(candidates) > 1:
+        # only SSIDs which are used by more than one access point
+        _, ssid_ids = np.unique(ssids[candidates].astype(str), return_inverse=True)
+        ssid_ids = ssid_ids.reshape(-1)
+        shared = np.bincount(ssid_ids)[ssid_ids] > 1
+        candidates, ssid_ids = candidates[shared], ssid_ids[shared]
+
+    if len(candidates) > 1:
+        # grid cells (shifted by one, so that the neighbours of a cell
+        # never become negative)
+        cx = np.floor(x[candidates] / distance).astype(np.int64)
+        cy = np.floor(y[candidates] / distance).astype(np.int64)
+        cx = cx - cx.min() + 1
+        cy = cy - cy.min() + 1
+        bx = int(cx.max() + 1).bit_length()
+        by = int(cy.max() + 1).bit_length()
+        bs = _KEY_BITS - bx - by
+        if bs < 1:
+            raise ValueError("the distance is too small for the extent of the capture")
+
+        # the SSID is stored in the high bits of the cell key, the SSIDs
+        # are processed in batches of 2^bs
+        ssid_ids = np.unique(ssid_ids, return_inverse=True)[1].reshape(-1)
+        batch_size = 1 << min(bs, 30)
+        offsets = [0, 1, (1 << by) - 1, 1 << by, (1 << by) + 1]
+        limit = distance * distance
+        for first in range(0, int(ssid_ids.max()) + 1, batch_size):
+            in_batch = (ssid_ids >= first) & (ssid_ids < first + batch_size)
+            idx = candidates[in_batch]
+            keys = ((ssid_ids[in_batch] - first) << (bx + by)) | (cx[in_batch] << by) | cy[in_batch]
+            order = np.argsort(keys, kind="stable")
+            skey, idx = keys[order], idx[order]
+            for offset in offsets:
+                for i, j in _neighbour_pairs(skey, offset, max_pairs):
+                    a, b = idx[i], idx[j]
+                    close = (x[a] - x[b]) ** 2 + (y[a] - y[b]) ** 2 <= limit
+                    for u, v in zip(a[close].tolist(), b[close].tolist()):
+                        uf.union(u, v)
+
+    clusters = {}
+    for i in range(n):
+        clusters.setdefault(uf.find(i), []).append(i)
+    return list(clusters.values())
+
+
+def cluster_accesspoints(aps, distance):
+    """
+    Collapse co-located access points with the same SSID. Access points
+    without other members are returned unchanged, each cluster is replaced
+    by an instance of kismetanalyzer.model.AccessPointCluster.
+
+    :param aps: iterable of instances of kismetanalyzer.model.AccessPoint
+    :param distance: maximum distance in meters
+
+    :return: list of access points and clusters in the order of their first
+             member
+    """
+    aps = list(aps)
+    result = []
+    for members in find_clusters(aps, distance):
+        if len(members) == 1:
+            result.append(aps[members[0]])
+        else:
+            result.append(AccessPointCluster.from_accesspoints([aps[i] for i in members]))
+    return result
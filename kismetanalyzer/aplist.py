@@ -15,8 +15,42 @@ import sys
 from fastkml import kml, styles
 from pygeoif import geometry
 
-from kismetanalyzer.model import AccessPoint
-from kismetanalyzer.util import does_ssid_matches
+from kismetanalyzer import geo, partition
+from kismetanalyzer.apclusters import cluster_accesspoints
+from kismetanalyzer.model import AccessPoint, AccessPointCluster
+from kismetanalyzer.oui import get_default_path, open_database
+from kismetanalyzer.pipeline import Pipeline, fetch_rows
+from kismetanalyzer.sorting import SORT_KEYS, ExternalSort, sort_devices
+from kismetanalyzer.util import does_ssid_matches, get_encryption_class
+
+
+# attributes of the geographic exports (name, type, getter)
+GEO_COLUMNS = [
+    ("mac", geo.STRING, lambda ap: ap.mac),
+    ("ssid", geo.STRING, lambda ap: ap.ssid),
+    ("encryption", geo.STRING, lambda ap: ap.encryption),
+    ("encryption_class", geo.STRING, lambda ap: get_encryption_class(ap.encryption)),
+    ("frequency", geo.DOUBLE, lambda ap: ap.frequency),
+    ("channel", geo.STRING, lambda ap: ap.channel),
+    ("manufacturer", geo.STRING, lambda ap: ap.manufacturer),
+    ("signal", geo.INT, lambda ap: ap.signal),
+    ("last_seen", geo.LONG, lambda ap: ap.last_time),
+    ("client_count", geo.INT, lambda ap: len(ap.client_map)),
+    ("clients", geo.STRING, lambda ap: ",".join(ap.client_map)),
+]
+
+# columns of the csv exports
+CSV_HEADER = ['MAC-Address', 'SSID', 'Encryption', 'Frequency', 'Channel', 'Manufacturer']
+
+# partitions supported by --partition-by
+PARTITIONS = ["geohash", "channel", "encryption"]
+
+
+def get_csv_row(dev):
+    """
+    Returns the columns of the csv exports for a device.
+    """
+    return [dev.mac, dev.ssid, dev.encryption, dev.frequency, dev.channel, dev.manufacturer]
 
 
 def get_description(ap):
@@ -31,6 +65,9 @@ def get_description(ap):
     clients = "\n".join(ap.client_map)
     desc = "MAC: {0}\nEncryption: {1}\nFrequency: {2}\nChannel: {3}\nManufacturer: {4}\n\nClients:\n{5}"
     description = desc.format(ap.mac, ap.encryption, ap.frequency, ap.channel, ap.manufacturer, clients)
+    if isinstance(ap, AccessPointCluster):
+        members = "\n".join(ap.member_macs)
+        description = "{0}\n\nAccess points ({1}):\n{2}".format(description, len(ap.members), members)
     return description
     
     
@@ -76,14 +113,65 @@ def export_csv(filename, devices, delimiter=";"):
     
     with open(outfile, mode='w') as csv_file:
         w = csv.writer(csv_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        w.writerow(['MAC-Address', 'SSID', 'Encryption', 'Frequency', 'Channel', 'Manufacturer'])
+        w.writerow(CSV_HEADER)
         for dev in devices:
-            w.writerow([dev.mac, dev.ssid, dev.encryption, dev.frequency, dev.channel, dev.manufacturer])
+            w.writerow(get_csv_row(dev))
             num_plotted = num_plotted + 1
         
     print ("Exported {} devices to {}".format(num_plotted, outfile))
 
 
+
+def export_csv_partitioned(filename, devices, partition_by, max_open=64):
+    """
+    Export found devices to one CSV file per partition (e.g. geohash cell or
+    channel) and write a manifest with the number of rows and the bounding
+    box of each file.
+
+    :param filename: Prefix for the filenames. The partition and the extension "csv" will be added
+    :param devices: iterable of devices
+    :param partition_by: partition specification (e.g. "geohash:5" or "channel")
+    :param max_open: maximum number of files which are open at the same time
+    """
+    key = partition.parse_partition(partition_by, PARTITIONS)
+    prefix = "{0}-aplist".format(filename)
+    num_plotted, num_shards, manifest = partition.export_partitioned(prefix, devices, CSV_HEADER, get_csv_row,
+                                                                     partition_by, key, max_open)
+    print("Exported {} devices to {} files (manifest: {})".format(num_plotted, num_shards, manifest))
+
+
+
+def export_clusters_csv(filename, devices, delimiter=";"):
+    """
+    Export clustered access points to a CSV file with one row per cluster
+    (see parameter --cluster). Access points which are not part of a
+    cluster are exported as cluster with one member.
+
+    :param filename: Prefix for the filename. The extension "csv" will be added
+    :param devices: iterable of access points and clusters
+    :param delimiter: Delimiter to use for separation of columns (optional)
+    """
+    import csv
+
+    num_plotted = 0
+
+    outfile = "{0}-apclusters.csv".format(filename)
+
+    with open(outfile, mode='w') as csv_file:
+        w = csv.writer(csv_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        w.writerow(['SSID', 'Access-Points', 'MAC-Addresses', 'Encryption', 'Channels', 'Manufacturer',
+                    'Longitude', 'Latitude'])
+        for dev in devices:
+            if not isinstance(dev, AccessPointCluster):
+                dev = AccessPointCluster.from_accesspoints([dev])
+            x, y = geo.get_coordinates(dev)
+            w.writerow([dev.ssid, len(dev.members), ",".join(dev.member_macs), dev.encryption,
+                        ",".join(dev.channels), dev.manufacturer, x, y])
+            num_plotted = num_plotted + 1
+
+    print("Exported {} clusters to {}".format(num_plotted, outfile))
+
+
 def export_kml(filename, title, devices):
     """
     Export found devices to a KML file which can be imported to Googleearth.
@@ -120,6 +208,107 @@ def export_kml(filename, title, devices):
     print("Exported {} devices to {}".format(num_plotted, outfile))
 
 
+def export_geojson(filename, devices):
+    """
+    Export found devices to a GeoJSON Text Sequence (RFC 8142) file. Each
+    device is written as soon as it is available.
+
+    :param filename: Prefix for the filename. The extension "geojsons" will be added
+    :param devices: iterable of devices
+    """
+    outfile = "{0}-aplist.geojsons".format(filename)
+    num_plotted = geo.export_geojsonseq(outfile, devices, GEO_COLUMNS)
+    print("Exported {} devices to {}".format(num_plotted, outfile))
+
+
+def export_fgb(filename, title, devices):
+    """
+    Export found devices to a FlatGeobuf file with a packed Hilbert R-tree
+    index, which can be loaded by web maps with HTTP range requests.
+
+    :param filename: Prefix for the filename. The extension "fgb" will be added
+    :param title: name which will be added to the FlatGeobuf header
+    :param devices: iterable of devices
+    """
+    outfile = "{0}-aplist.fgb".format(filename)
+    num_plotted = geo.export_flatgeobuf(outfile, title, devices, GEO_COLUMNS)
+    print("Exported {} devices to {}".format(num_plotted, outfile))
+
+
+def get_accesspoint(row, parameters):
+    """
+    Convert a row of the devices table into an access point and apply the
+    filters given on the command line.
+
+    :param row: SQL result row of the kismet database table devices
+    :param parameters: parsed command line arguments
+
+    :return: instance of kismetanalyzer.model.AccessPoint or None if the
+             access point is filtered or can't be parsed
+    """
+    try:
+        # create a device dictionary from json string stored in the
+        # device column of the kismet database
+        dev = json.loads(row[14])
+
+        # convert json device string into an instance of the
+        # class kismetanalyzer.model.AccessPoint
+        strongest = parameters.strongest
+        ap = AccessPoint.from_json(dev, strongest)
+
+        # fill in the manufacturer from the offline OUI database
+        if parameters.ouidb is not None:
+            ap.manufacturer = parameters.ouidb.resolve(ap.mac, ap.manufacturer)
+
+        # Apply SSID filter if it is used as parameter (this switch
+        # checks the included SSID list, which is provided by the
+        # parameter --ssid
+        if parameters.ssid is not None:
+            if not does_ssid_matches(dev, parameters.ssid):
+                # SSID doesn't match, skip this access point
+                return None
+
+        # Apply SSID filter if it is used as parameter (this switch
+        # checks the excluded SSID list, which is provided by the
+        # parameter --exclude-ssid )
+        if parameters.excludessid is not None:
+            if does_ssid_matches(dev, parameters.excludessid):
+                # SSID matches, skip this access point
+                return None
+
+        # skip device if the secified encryption string is not
+        # present in the device encryption string
+        if parameters.encryption:
+            if not parameters.encryption in ap.encryption:
+                return None
+
+        if parameters.verbose:
+            print ("{:20s}{:20s}{:40s}".format(ap.mac, ap.encryption, ap.ssid))
+
+        return ap
+
+    except Exception as e:
+        return None
+
+
+def prepare_accesspoints(devs, parameters):
+    """
+    Apply the clustering and sorting given on the command line to the
+    access points.
+
+    :param devs: iterable of access points
+    :param parameters: parsed command line arguments
+
+    :return: list of access points or instance of
+             kismetanalyzer.sorting.ExternalSort
+    """
+    if parameters.cluster:
+        devs = cluster_accesspoints(devs, parameters.cluster)
+    if parameters.sortby:
+        devs = sort_devices(devs, parameters.sortby, parameters.top, parameters.sortbuffer)
+    return devs
+
+
 def gen_aplist():
     parser = argparse.ArgumentParser(description="List access points discovered by kismet.")
     parser.add_argument("--in", action="store", dest="infile", required=True, help='Input file (.kismet)')
@@ -132,8 +321,42 @@ def gen_aplist():
     parser.add_argument("--csv", action="store_true", dest="csv", default=False, help="Export results to csv")
     parser.add_argument("--kml", action="store_true", dest="kml", default=False, help="Export results to kml")
     parser.add_argument("--verbose", action="store_true", dest="verbose", default=False, help="Print MAC, SSID, encryption type to stdout")
+    parser.add_argument("--geojson", action="store_true", dest="geojson", default=False,
+                        help="Export results to GeoJSON Text Sequence (.geojsons)")
+    parser.add_argument("--fgb", action="store_true", dest="fgb", default=False,
+                        help="Export results to FlatGeobuf with spatial index (.fgb)")
+    parser.add_argument("--threads", action="store_true", dest="threads", default=False,
+                        help="Overlap database reads, decoding and exports using worker threads")
+    parser.add_argument("--sort-by", action="store", dest="sortby", default=None, choices=sorted(SORT_KEYS),
+                        help="Sort the results (signal, clients and last_seen descending, channel and ssid ascending)")
+    parser.add_argument("--top", action="store", dest="top", type=int, default=None,
+                        help="Export only the first N results (requires --sort-by)")
+    parser.add_argument("--sort-buffer", action="store", dest="sortbuffer", type=int, default=100000,
+                        help="Maximum number of devices kept in memory while sorting (default: 100000)")
+    parser.add_argument("--oui", action="store", dest="oui", nargs="?", const=get_default_path(), default=None,
+                        help="Resolve manufacturers with the offline OUI database (optional path, see kismet_analyzer_oui)")
+    parser.add_argument("--partition-by", action="store", dest="partitionby", default=None,
+                        help="Split the csv export into one file per partition ({0}) and write a manifest"
+                        .format(", ".join(p + ":N" if p == "geohash" else p for p in PARTITIONS)))
+    parser.add_argument("--max-open-files", action="store", dest="maxopen", type=int, default=64,
+                        help="Maximum number of partition files kept open at the same time (default: 64)")
+    parser.add_argument("--cluster", action="store", dest="cluster", type=float, default=None, metavar="METERS",
+                        help="Collapse access points with the same SSID which are located within the given "
+                             "distance into one placemark / csv row")
     parameters = parser.parse_args()
 
+    if parameters.top is not None and parameters.sortby is None:
+        parser.error("--top requires --sort-by")
+
+    if parameters.cluster is not None and parameters.cluster <= 0:
+        parser.error("--cluster requires a distance greater than 0")
+
+    if parameters.partitionby is not None:
+        try:
+            partition.parse_partition(parameters.partitionby, PARTITIONS)
+        except ValueError as e:
+            parser.error("--partition-by: {0}".format(e))
+
     # set the filename prefix for the output file if it is not specified
     # via the parameter --out
     if parameters.outfile is None:
@@ -141,7 +364,53 @@ def gen_aplist():
             parameters.outfile = parameters.infile[:-7]
         else:
             parameters.outfile = parameters.infile
+
+    # offline OUI database to fill in the manufacturer names
+    parameters.ouidb = None
+    if parameters.oui is not None:
+        parameters.ouidb = open_database(parameters.oui)
     
+    sql = "SELECT * FROM devices where type='Wi-Fi AP'; "
+
+    if parameters.threads:
+        # run database reads, decoding and the exports in separate
+        # threads which are connected by bounded queues
+        consumers = []
+        if parameters.csv and parameters.partitionby:
+            consumers.append(lambda devs: export_csv_partitioned(parameters.outfile, devs, parameters.partitionby,
+                                                                 parameters.maxopen))
+        elif parameters.csv and parameters.cluster:
+            consumers.append(lambda devs: export_clusters_csv(parameters.outfile, devs))
+        elif parameters.csv:
+            consumers.append(lambda devs: export_csv(parameters.outfile, devs))
+        if parameters.kml:
+            consumers.append(lambda devs: export_kml(parameters.outfile, parameters.title, devs))
+        if parameters.geojson:
+            consumers.append(lambda devs: export_geojson(parameters.outfile, devs))
+        if parameters.fgb:
+            consumers.append(lambda devs: export_fgb(parameters.outfile, parameters.title, devs))
+        if not consumers:
+            consumers.append(lambda devs: sum(1 for _ in devs))
+
+        fetch = fetch_rows(parameters.infile, sql)
+        decode = lambda row: get_accesspoint(row, parameters)
+        result = []
+        try:
+            if parameters.sortby or parameters.cluster:
+                # sorting and clustering need all devices, so the exports
+                # are started once the result is available
+                prepare = lambda devs: result.append(prepare_accesspoints(devs, parameters))
+                Pipeline(fetch, decode, [prepare]).run()
+                fetch, decode = (lambda: iter(result[0])), (lambda dev: dev)
+            Pipeline(fetch, decode, consumers).run()
+        except Exception as e:
+            print("Failed to process kismet logfile: {0}".format(e))
+            sys.exit(1)
+        finally:
+            if result and isinstance(result[0], ExternalSort):
+                result[0].close()
+        return
+
     try:
         db = sqlite3.connect(parameters.infile)
     except Exception as e:
@@ -149,60 +418,40 @@ def gen_aplist():
         sys.exit(1)
     
     try:  
-        sql = "SELECT * FROM devices where type='Wi-Fi AP'; "
         c = db.cursor()
         sql_result = c.execute(sql)    
     except:
         print ("Failed to extract data from database")
         sys.exit()
     
-    # container for collecting relevant devices
-    devs = []
-    for row in sql_result:
-        try:
-            # create a device dictionary from json string stored in the
-            # device column of the kismet database
-            dev = json.loads(row[14])
-            
-            # convert json device string into an instance of the 
-            # class kismetanalyzer.model.AccessPoint
-            strongest = parameters.strongest
-            ap = AccessPoint.from_json(dev, strongest)
-            
-            # Apply SSID filter if it is used as parameter (this switch
-            # checks the included SSID list, which is provided by the 
-            # parameter --ssid 
-            if parameters.ssid is not None:
-                if not does_ssid_matches(dev, parameters.ssid):
-                    # SSID doesn't match, skip this access point
-                    continue
-            
-            # Apply SSID filter if it is used as parameter (this switch 
-            # checks the excluded SSID list, which is provided by the 
-            # parameter --exclude-ssid )
-            if parameters.excludessid is not None:
-                if does_ssid_matches(dev, parameters.excludessid):
-                    # SSID matches, skip this access point
-                    continue
-            
-            # skip device if the secified encryption string is not 
-            # present in the device encryption string
-            if parameters.encryption:
-                if not parameters.encryption in ap.encryption:
-                    continue
-
-
-            if parameters.verbose:
-                print ("{:20s}{:20s}{:40s}".format(ap.mac, ap.encryption, ap.ssid))
-
-            devs.append(ap)
-        
-        except Exception as e:
-            continue
+    # relevant devices (the rows are only decoded while iterating)
+    devs = (ap for ap in (get_accesspoint(row, parameters) for row in sql_result) if ap is not None)
+
+    if parameters.sortby or parameters.cluster:
+        devs = prepare_accesspoints(devs, parameters)
+    elif [parameters.csv, parameters.kml, parameters.geojson, parameters.fgb].count(True) != 1:
+        # the devices are exported more than once (or not at all, then the
+        # devices are only decoded, e.g. for --verbose)
+        devs = list(devs)
 
     
-    if parameters.csv:
-        export_csv(parameters.outfile, devs)
-         
-    if parameters.kml:
-        export_kml(parameters.outfile, parameters.title, devs)
+    try:
+        if parameters.csv and parameters.partitionby:
+            export_csv_partitioned(parameters.outfile, devs, parameters.partitionby, parameters.maxopen)
+        elif parameters.csv and parameters.cluster:
+            export_clusters_csv(parameters.outfile, devs)
+        elif parameters.csv:
+            export_csv(parameters.outfile, devs)
+
+        if parameters.kml:
+            export_kml(parameters.outfile, parameters.title, devs)
+
+        if parameters.geojson:
+            export_geojson(parameters.outfile, devs)
+
+        if parameters.fgb:
+            export_fgb(parameters.outfile, parameters.title, devs)
+    finally:
+        # remove the temporary files of the sort (also if an export fails)
+        if isinstance(devs, ExternalSort):
+            devs.close()
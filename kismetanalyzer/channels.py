@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+# Simple script to analyze the channel occupancy over time. The packets table
+# of the kismet database is read in chunks and per-frequency, per-time-bucket
+# histograms of the packet count, bytes and signal are accumulated with
+# NumPy. Only the histograms are kept in memory, so the memory usage does not
+# depend on the number of packets.
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import json
+import sqlite3
+import sys
+
+import numpy as np
+
+from kismetanalyzer.util import frequency_to_channel
+
+
+class ChannelHistogram(object):
+    """
+    Per-frequency and per-time-bucket statistics of packets. The values are
+    stored in a dictionary (bucket, frequency) -> [packets, bytes,
+    signal sum, signal count, signal min, signal max], which has one entry
+    per bucket and frequency, independent of the number of packets.
+    """
+
+    def __init__(self, bucket_size=60):
+        if bucket_size <= 0:
+            raise ValueError("the bucket size must be greater than 0")
+        self._bucket_size = bucket_size
+        self.cells = {}
+
+    def add(self, ts, frequency, length, signal):
+        """
+        Add a chunk of packets.
+
+        :param ts: numpy array with the timestamps (seconds)
+        :param frequency: numpy array with the frequencies (kHz)
+        :param length: numpy array with the packet lengths (bytes)
+        :param signal: numpy array with the signal (dBm, 0 if unknown)
+        """
+        if len(ts) == 0:
+            return
+        # combine bucket number and frequency (kHz, < 2^24) into one key
+        keys = ((ts // self._bucket_size) << 24) | (frequency & 0xFFFFFF)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n = len(keys)
+
+        has_signal = signal != 0
+        packets = np.bincount(inverse, minlength=n)
+        size = np.bincount(inverse, weights=length, minlength=n)
+        signal_sum = np.bincount(inverse, weights=np.where(has_signal, signal, 0), minlength=n)
+        signal_count = np.bincount(inverse, weights=has_signal, minlength=n)
+        signal_min = np.full(n, np.inf)
+        signal_max = np.full(n, -np.inf)
+        np.minimum.at(signal_min, inverse[has_signal], signal[has_signal])
+        np.maximum.at(signal_max, inverse[has_signal], signal[has_signal])
+
+        # merge the statistics of the chunk (one entry per bucket and
+        # frequency) into the histogram
+        for i, key in enumerate(keys.tolist()):
+            bucket, freq = (key >> 24) * self._bucket_size, key & 0xFFFFFF
+            cell = self.cells.get((bucket, freq))
+            if cell is None:
+                self.cells[(bucket, freq)] = [int(packets[i]), float(size[i]), float(signal_sum[i]),
+                                              int(signal_count[i]), float(signal_min[i]), float(signal_max[i])]
+            else:
+                cell[0] += int(packets[i])
+                cell[1] += float(size[i])
+                cell[2] += float(signal_sum[i])
+                cell[3] += int(signal_count[i])
+                cell[4] = min(cell[4], float(signal_min[i]))
+                cell[5] = max(cell[5], float(signal_max[i]))
+
+    def records(self):
+        """
+        Returns the statistics ordered by bucket and frequency as list of
+        dictionaries.
+        """
+        result = []
+        for (bucket, freq), cell in sorted(self.cells.items()):
+            packets, size, signal_sum, signal_count, signal_min, signal_max = cell
+            result.append({
+                "bucket": int(bucket),
+                "frequency": int(freq),
+                "channel": frequency_to_channel(freq),
+                "packets": packets,
+                "bytes": int(size),
+                "avg_signal": round(signal_sum / signal_count, 1) if signal_count else None,
+                "min_signal": int(signal_min) if signal_count else None,
+                "max_signal": int(signal_max) if signal_count else None,
+            })
+        return result
+
+    def totals(self):
+        """
+        Returns the number of packets and bytes per frequency.
+        """
+        totals = {}
+        for (bucket, freq), cell in self.cells.items():
+            t = totals.setdefault(freq, [0, 0.0])
+            t[0] += cell[0]
+            t[1] += cell[1]
+        return totals
+
+
+def read_packets(db, histogram, chunk_size=100000):
+    """
+    Read the packets table in chunks and add them to the histogram. Packets
+    without timestamp are skipped.
+
+    :param db: sqlite connection
+    :param histogram: instance of ChannelHistogram
+    :param chunk_size: number of packets per chunk
+
+    :return: number of packets
+    :rtype: int
+    """
+    sql = ("SELECT ts_sec, COALESCE(frequency, 0), COALESCE(packet_len, 0), COALESCE(signal, 0) FROM packets "
+           "WHERE ts_sec IS NOT NULL; ")
+    c = db.cursor()
+    c.execute(sql)
+    num_packets = 0
+    while True:
+        rows = c.fetchmany(chunk_size)
+        if not rows:
+            break
+        data = np.array(rows, dtype=np.float64)
+        histogram.add(data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2], data[:, 3])
+        num_packets += len(rows)
+    return num_packets
+
+
+HEADER = ['Bucket', 'Frequency', 'Channel', 'Packets', 'Bytes', 'Avg-Signal', 'Min-Signal', 'Max-Signal']
+
+
+def export_csv(filename, records, delimiter=";"):
+    """
+    Export the channel statistics to a CSV file. The filename prefix and the
+    records are required. The delimiter is optional.
+
+    :param filename: Prefix for the filename. The extension "csv" will be added
+    :param records: list of records returned by ChannelHistogram.records()
+    :param delimiter: Delimiter to use for separation of columns (optional)
+    """
+    import csv
+
+    outfile = "{0}-channels.csv".format(filename)
+
+    with open(outfile, mode='w') as csv_file:
+        w = csv.writer(csv_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        w.writerow(HEADER)
+        for r in records:
+            w.writerow([r["bucket"], r["frequency"], r["channel"], r["packets"], r["bytes"], r["avg_signal"],
+                        r["min_signal"], r["max_signal"]])
+
+    print("Exported {} buckets to {}".format(len(records), outfile))
+
+
+def export_json(filename, records):
+    """
+    Export the channel statistics to a JSON file.
+
+    :param filename: Prefix for the filename. The extension "json" will be added
+    :param records: list of records returned by ChannelHistogram.records()
+    """
+    outfile = "{0}-channels.json".format(filename)
+
+    with open(outfile, mode='w') as f:
+        json.dump(records, f, indent=2)
+
+    print("Exported {} buckets to {}".format(len(records), outfile))
+
+
+def gen_channels():
+    parser = argparse.ArgumentParser(description="Analyze the channel occupancy over time from the packets table.")
+    parser.add_argument("--in", action="store", dest="infile", required=True, help='Input file (.kismet)')
+    parser.add_argument("--out", action="store", dest="outfile", help='Output filename (optional)')
+    parser.add_argument("--bucket", action="store", dest="bucket", type=int, default=60,
+                        help='Size of the time buckets in seconds (default: 60)')
+    parser.add_argument("--chunk-size", action="store", dest="chunksize", type=int, default=100000,
+                        help='Number of packets read per chunk (default: 100000)')
+    parser.add_argument("--csv", action="store_true", dest="csv", default=False, help="Export results to csv")
+    parser.add_argument("--json", action="store_true", dest="json", default=False, help="Export results to json")
+    parameters = parser.parse_args()
+
+    if parameters.bucket <= 0:
+        parser.error("--bucket must be greater than 0")
+    if parameters.chunksize <= 0:
+        parser.error("--chunk-size must be greater than 0")
+
+    # set the filename prefix for the output file if it is not specified
+    # via the parameter --out
+    if parameters.outfile is None:
+        if parameters.infile.endswith(".kismet"):
+            parameters.outfile = parameters.infile[:-7]
+        else:
+            parameters.outfile = parameters.infile
+
+    try:
+        db = sqlite3.connect(parameters.infile)
+    except Exception as e:
+        print("Failed to open kismet logfile: {0}".format(e))
+        sys.exit(1)
+
+    histogram = ChannelHistogram(parameters.bucket)
+    try:
+        read_packets(db, histogram, parameters.chunksize)
+    except Exception:
+        print("Failed to extract data from database")
+        sys.exit()
+
+    # print the totals per channel
+    for freq, (packets, size) in sorted(histogram.totals().items()):
+        print("{:>10d}{:>6s}{:>14d} packets{:>16d} bytes".format(int(freq), frequency_to_channel(freq),
+                                                               packets, int(size)))
+
+    if parameters.csv:
+        export_csv(parameters.outfile, histogram.records())
+
+    if parameters.json:
+        export_json(parameters.outfile, histogram.records())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+# Simple script to group Wi-Fi clients with randomized MAC addresses which
+# probably belong to the same physical device. Clients are fingerprinted by
+# their probed SSIDs, manufacturer and timing. Similar fingerprints are found
+# with MinHash / LSH, so that no all-pairs comparison is required.
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import zlib
+from collections import deque
+
+from kismetanalyzer.model import Client
+from kismetanalyzer.oui import get_default_path, open_database
+
+# large prime (2^61 - 1) used for the universal hash functions of the
+# MinHash signatures
+_PRIME = (1 << 61) - 1
+
+
+class UnionFind(object):
+    """
+    Simple disjoint set structure with path compression and union by size.
+    """
+
+    def __init__(self, size):
+        self._parent = list(range(size))
+        self._size = [1] * size
+
+    def find(self, i):
+        root = i
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[i] != root:
+            self._parent[i], i = root, self._parent[i]
+        return root
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size[b]
+
+
+def build_index(clients):
+    """
+    Build an inverted index which maps each probed SSID to the positions
+    of the clients that probed for it.
+
+    :param clients: list of kismetanalyzer.model.Client instances
+
+    :return: dictionary SSID -> list of client positions
+    :rtype: dict
+    """
+    index = {}
+    for i, c in enumerate(clients):
+        for ssid in set(c.probed_ssids):
+            index.setdefault(ssid, []).append(i)
+    return index
+
+
+def get_fingerprints(clients, index, max_share=0.1):
+    """
+    Create the fingerprint (set of probed SSIDs) for every client. SSIDs
+    which are probed by more than max_share of all devices (e.g. "eduroam")
+    carry no information about the device and are dropped.
+
+    The share is not based on the number of clients: a device which rotates
+    its MAC address probes the same SSIDs from each MAC. Clients with the
+    same manufacturer and the same set of probed SSIDs are therefore counted
+    only once, so the MAC rotation of one device can't make its SSIDs
+    common.
+
+    :param clients: list of kismetanalyzer.model.Client instances
+    :param index: inverted index created by build_index()
+    :param max_share: maximum share of devices an SSID may be probed by
+
+    :return: list of frozensets (one per client)
+    :rtype: list
+    """
+    groups = [(c.manufacturer, frozenset(c.probed_ssids)) for c in clients]
+    limit = max(2, int(len(set(groups)) * max_share))
+    common = set(ssid for ssid, members in index.items() if len(set(groups[i] for i in members)) > limit)
+    return [frozenset(c.probed_ssids) - common for c in clients]
+
+
+def get_hash_functions(num_perm, seed=1):
+    """
+    Generate the coefficients of num_perm universal hash functions.
+    """
+    rnd = random.Random(seed)
+    return [(rnd.randrange(1, _PRIME), rnd.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+
+def minhash(fingerprint, hash_functions, cache):
+    """
+    Calculate the MinHash signature of a fingerprint. The hash values of
+    each SSID are cached, since the same SSIDs are probed by many clients.
+
+    :param fingerprint: set of SSIDs
+    :param hash_functions: coefficients created by get_hash_functions()
+    :param cache: dictionary SSID -> hash values (updated in place)
+
+    :return: signature as tuple
+    :rtype: tuple
+    """
+    signature = None
+    for ssid in fingerprint:
+        values = cache.get(ssid)
+        if values is None:
+            x = zlib.crc32(ssid.encode("utf-8"))
+            values = tuple((a * x + b) % _PRIME for a, b in hash_functions)
+            cache[ssid] = values
+        if signature is None:
+            signature = values
+        else:
+            signature = tuple(map(min, signature, values))
+    return signature
+
+
+def is_same_device(a, b, fp_a, fp_b, threshold, max_gap):
+    """
+    Verify a candidate pair found by LSH. The fingerprints must have an
+    exact jaccard similarity of at least threshold and the clients must
+    have been seen within max_gap seconds of each other.
+    """
+    gap = max(a.first_time, b.first_time) - min(a.last_time, b.last_time)
+    if gap > max_gap:
+        return False
+    union = len(fp_a | fp_b)
+    if union == 0:
+        return False
+    return float(len(fp_a & fp_b)) / union >= threshold
+
+
+def cluster_clients(clients, threshold=0.5, bands=16, rows=4, max_gap=3600, max_share=0.1, bucket_size=4):
+    """
+    Group clients which probably belong to the same physical device.
+
+    Each client is hashed into one LSH bucket per band. The bucket key
+    contains the manufacturer, so only clients of the same vendor are
+    compared. The clients are processed in the order of their first
+    observation and every client is only verified against the most recent
+    members of its buckets, which keeps the runtime linear in the number of
+    clients. A device which rotates its MAC address more often than max_gap
+    is thereby linked from one MAC to the next.
+
+    :param clients: list of kismetanalyzer.model.Client instances
+    :param threshold: minimum jaccard similarity of the probed SSIDs
+    :param bands: number of LSH bands
+    :param rows: number of MinHash values per band
+    :param max_gap: maximum time in seconds between two observations
+    :param max_share: see get_fingerprints()
+    :param bucket_size: number of recent members per bucket a client is
+                        verified against
+
+    :return: list of clusters. Each cluster is a list of clients, the
+             largest clusters come first.
+    :rtype: list
+    """
+    index = build_index(clients)
+    fingerprints = get_fingerprints(clients, index, max_share)
+    hash_functions = get_hash_functions(bands * rows)
+    cache = {}
+    buckets = {}
+    uf = UnionFind(len(clients))
+
+    for i in sorted(range(len(clients)), key=lambda i: clients[i].first_time):
+        fp = fingerprints[i]
+        if not fp:
+            # nothing to compare (client sent only broadcast probes)
+            continue
+        signature = minhash(fp, hash_functions, cache)
+        for band in range(bands):
+            key = (band, clients[i].manufacturer, signature[band * rows:(band + 1) * rows])
+            recent = buckets.get(key)
+            if recent is None:
+                recent = buckets[key] = deque(maxlen=bucket_size)
+            for rep in recent:
+                if uf.find(rep) == uf.find(i):
+                    continue
+                if is_same_device(clients[i], clients[rep], fp, fingerprints[rep], threshold, max_gap):
+                    uf.union(i, rep)
+            recent.append(i)
+
+    groups = {}
+    for i, c in enumerate(clients):
+        groups.setdefault(uf.find(i), []).append(c)
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def export_csv(filename, clusters, delimiter=";"):
+    """
+    Export the client clusters to a CSV file. The filename prefix and the
+    list of clusters is required. The delimiter is optional.
+
+    :param filename: Prefix for the filename. The extension "csv" will be added
+    :param clusters: list of clusters as returned by cluster_clients()
+    :param delimiter: Delimiter to use for separation of columns (optional)
+    """
+    import csv
+
+    num_plotted = 0
+
+    outfile = "{0}-clientclusters.csv".format(filename)
+
+    with open(outfile, mode='w') as csv_file:
+        w = csv.writer(csv_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        w.writerow(['Cluster', 'MAC-Address', 'Manufacturer', 'Randomized', 'First-Seen', 'Last-Seen', 'Probed-SSIDs'])
+        for num, cluster in enumerate(clusters, 1):
+            for c in cluster:
+                w.writerow([num, c.mac, c.manufacturer, c.randomized, c.first_time, c.last_time,
+                            ",".join(sorted(set(c.probed_ssids)))])
+                num_plotted = num_plotted + 1
+
+    print("Exported {} clients in {} clusters to {}".format(num_plotted, len(clusters), outfile))
+
+
+def gen_clientclusters():
+    parser = argparse.ArgumentParser(description="Group randomized client MACs which probably belong to the same device.")
+    parser.add_argument("--in", action="store", dest="infile", required=True, help='Input file (.kismet)')
+    parser.add_argument("--out", action="store", dest="outfile", help='Output filename (optional)')
+    parser.add_argument("--threshold", action="store", dest="threshold", type=float, default=0.5,
+                        help='Minimum jaccard similarity of the probed SSIDs (default: 0.5)')
+    parser.add_argument("--bands", action="store", dest="bands", type=int, default=16,
+                        help='Number of LSH bands (default: 16)')
+    parser.add_argument("--rows", action="store", dest="rows", type=int, default=4,
+                        help='Number of MinHash values per LSH band (default: 4)')
+    parser.add_argument("--max-gap", action="store", dest="maxgap", type=int, default=3600,
+                        help='Maximum time in seconds between the observations of two MACs of one device (default: 3600)')
+    parser.add_argument("--max-ssid-share", action="store", dest="maxshare", type=float, default=0.1,
+                        help='Ignore SSIDs probed by more than this share of all devices (default: 0.1)')
+    parser.add_argument("--all", action="store_true", dest="all", default=False,
+                        help='Include clients with globally administered MAC addresses')
+    parser.add_argument("--verbose", action="store_true", dest="verbose", default=False,
+                        help="Print clusters with more than one MAC to stdout")
+    parser.add_argument("--oui", action="store", dest="oui", nargs="?", const=get_default_path(), default=None,
+                        help="Resolve manufacturers with the offline OUI database (optional path, see kismet_analyzer_oui)")
+    parameters = parser.parse_args()
+
+    # set the filename prefix for the output file if it is not specified
+    # via the parameter --out
+    if parameters.outfile is None:
+        if parameters.infile.endswith(".kismet"):
+            parameters.outfile = parameters.infile[:-7]
+        else:
+            parameters.outfile = parameters.infile
+
+    # offline OUI database to fill in the manufacturer names
+    parameters.ouidb = None
+    if parameters.oui is not None:
+        parameters.ouidb = open_database(parameters.oui)
+
+    try:
+        db = sqlite3.connect(parameters.infile)
+    except Exception as e:
+        print("Failed to open kismet logfile: {0}".format(e))
+        sys.exit(1)
+
+    try:
+        sql = "SELECT device FROM devices where type='Wi-Fi Client'; "
+        c = db.cursor()
+        sql_result = c.execute(sql)
+    except:
+        print("Failed to extract data from database")
+        sys.exit()
+
+    # container for collecting relevant clients
+    clients = []
+    for row in sql_result:
+        try:
+            # create a device dictionary from json string stored in the
+            # device column of the kismet database
+            dev = json.loads(row[0])
+
+            # convert json device string into an instance of the
+            # class kismetanalyzer.model.Client
+            client = Client.from_json(dev)
+            if parameters.ouidb is not None:
+                client.manufacturer = parameters.ouidb.resolve(client.mac, client.manufacturer)
+            if not parameters.all and not client.randomized:
+                continue
+
+            clients.append(client)
+
+        except Exception as e:
+            continue
+
+    clusters = cluster_clients(clients, parameters.threshold, parameters.bands, parameters.rows,
+                               parameters.maxgap, parameters.maxshare)
+
+    if parameters.verbose:
+        for num, cluster in enumerate(clusters, 1):
+            if len(cluster) < 2:
+                break
+            print("{:<8d}{}".format(num, " ".join(c.mac for c in cluster)))
+
+    export_csv(parameters.outfile, clusters)
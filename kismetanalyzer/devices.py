@@ -15,10 +15,43 @@ import sys
 from fastkml import kml, styles
 from pygeoif import geometry
 
+from kismetanalyzer import geo, partition
 from kismetanalyzer.model import Device
+from kismetanalyzer.oui import get_default_path, open_database
+from kismetanalyzer.pipeline import Pipeline, fetch_rows
+from kismetanalyzer.sorting import SORT_KEYS, ExternalSort, sort_devices
 from kismetanalyzer.util import does_ssid_matches
 
 
+# attributes of the geographic exports (name, type, getter)
+GEO_COLUMNS = [
+    ("mac", geo.STRING, lambda d: d.mac),
+    ("type", geo.STRING, lambda d: d.type),
+    ("name", geo.STRING, lambda d: d.name),
+    ("commonname", geo.STRING, lambda d: d.commonname),
+    ("phyname", geo.STRING, lambda d: d.phyname),
+    ("frequency", geo.DOUBLE, lambda d: d.frequency),
+    ("channel", geo.STRING, lambda d: d.channel),
+    ("manufacturer", geo.STRING, lambda d: d.manufacturer),
+    ("signal", geo.INT, lambda d: d.signal),
+    ("last_seen", geo.LONG, lambda d: d.last_time),
+    ("client_count", geo.INT, lambda d: len(d.client_map)),
+]
+
+# columns of the csv exports
+CSV_HEADER = ['MAC-Address', 'TYPE', 'NAME', 'COMMONNAME', 'PHYNAME', 'Frequency', 'Channel', 'Manufacturer']
+
+# partitions supported by --partition-by
+PARTITIONS = ["geohash", "channel", "type"]
+
+
+def get_csv_row(dev):
+    """
+    Returns the columns of the csv exports for a device.
+    """
+    return [dev.mac, dev.type, dev.name, dev.commonname, dev.phyname, dev.frequency, dev.channel, dev.manufacturer]
+
+
 def get_description(dev):
     """
     This function is used to create the description string for the device.
@@ -51,14 +84,33 @@ def export_csv(filename, devices, delimiter=";"):
 
     with open(outfile, mode='w') as csv_file:
         w = csv.writer(csv_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        w.writerow(['MAC-Address', 'TYPE', 'NAME', 'COMMONNAME', 'PHYNAME', 'Frequency', 'Channel', 'Manufacturer'])
+        w.writerow(CSV_HEADER)
         for dev in devices:
-            w.writerow([dev.mac, dev.type, dev.name, dev.commonname, dev.phyname, dev.frequency, dev.channel, dev.manufacturer])
+            w.writerow(get_csv_row(dev))
             num_plotted = num_plotted + 1
 
     print("Exported {} devices to {}".format(num_plotted, outfile))
 
 
+
+def export_csv_partitioned(filename, devices, partition_by, max_open=64):
+    """
+    Export found devices to one CSV file per partition (e.g. geohash cell or
+    channel) and write a manifest with the number of rows and the bounding
+    box of each file.
+
+    :param filename: Prefix for the filenames. The partition and the extension "csv" will be added
+    :param devices: iterable of devices
+    :param partition_by: partition specification (e.g. "geohash:5" or "channel")
+    :param max_open: maximum number of files which are open at the same time
+    """
+    key = partition.parse_partition(partition_by, PARTITIONS)
+    prefix = "{0}-devices".format(filename)
+    num_plotted, num_shards, manifest = partition.export_partitioned(prefix, devices, CSV_HEADER, get_csv_row,
+                                                                     partition_by, key, max_open)
+    print("Exported {} devices to {} files (manifest: {})".format(num_plotted, num_shards, manifest))
+
+
 def export_kml(filename, title, devices):
     """
     Export found devices to a KML file which can be imported to Googleearth.
@@ -95,6 +147,70 @@ def export_kml(filename, title, devices):
     print("Exported {} devices to {}".format(num_plotted, outfile))
 
 
+def export_geojson(filename, devices):
+    """
+    Export found devices to a GeoJSON Text Sequence (RFC 8142) file. Each
+    device is written as soon as it is available.
+
+    :param filename: Prefix for the filename. The extension "geojsons" will be added
+    :param devices: iterable of devices
+    """
+    outfile = "{0}-devices.geojsons".format(filename)
+    num_plotted = geo.export_geojsonseq(outfile, devices, GEO_COLUMNS)
+    print("Exported {} devices to {}".format(num_plotted, outfile))
+
+
+def export_fgb(filename, title, devices):
+    """
+    Export found devices to a FlatGeobuf file with a packed Hilbert R-tree
+    index, which can be loaded by web maps with HTTP range requests.
+
+    :param filename: Prefix for the filename. The extension "fgb" will be added
+    :param title: name which will be added to the FlatGeobuf header
+    :param devices: iterable of devices
+    """
+    outfile = "{0}-devices.fgb".format(filename)
+    num_plotted = geo.export_flatgeobuf(outfile, title, devices, GEO_COLUMNS)
+    print("Exported {} devices to {}".format(num_plotted, outfile))
+
+
+def get_device(row, parameters):
+    """
+    Convert a row of the devices table into a device and apply the filters
+    given on the command line.
+
+    :param row: SQL result row of the kismet database table devices
+    :param parameters: parsed command line arguments
+
+    :return: instance of kismetanalyzer.model.Device or None if the device
+             is filtered or can't be parsed
+    """
+    try:
+        # create a device dictionary from json string stored in the
+        # device column of the kismet database
+        dev = json.loads(row[14])
+        # convert json device string into an instance of the
+        # class kismetanalyzer.model.AccessPoint
+        strongest = parameters.strongest
+        d = Device.from_json(dev, strongest)
+
+        # fill in the manufacturer from the offline OUI database
+        if parameters.ouidb is not None:
+            d.manufacturer = parameters.ouidb.resolve(d.mac, d.manufacturer)
+
+        if parameters.type is not None:
+            if parameters.type not in d.type:
+                return None
+
+        if parameters.verbose:
+            print("{:20s}{:40s}{:10s}".format(d.mac, d.type, d.channel))
+
+        return d
+
+    except Exception as e:
+        return None
+
+
 def gen_devlist():
     parser = argparse.ArgumentParser(description="List devices discovered by kismet.")
     parser.add_argument("--in", action="store", dest="infile", required=True, help='Input file (.kismet)')
@@ -107,8 +223,36 @@ def gen_devlist():
     parser.add_argument("--type", action="store", dest="type", default=None, help='Filter by Type')
     parser.add_argument("--verbose", action="store_true", dest="verbose", default=False,
                         help="Print MAC, TYPE, CHANNEL type to stdout")
+    parser.add_argument("--geojson", action="store_true", dest="geojson", default=False,
+                        help="Export results to GeoJSON Text Sequence (.geojsons)")
+    parser.add_argument("--fgb", action="store_true", dest="fgb", default=False,
+                        help="Export results to FlatGeobuf with spatial index (.fgb)")
+    parser.add_argument("--threads", action="store_true", dest="threads", default=False,
+                        help="Overlap database reads, decoding and exports using worker threads")
+    parser.add_argument("--sort-by", action="store", dest="sortby", default=None, choices=sorted(SORT_KEYS),
+                        help="Sort the results (signal, clients and last_seen descending, channel and ssid ascending)")
+    parser.add_argument("--top", action="store", dest="top", type=int, default=None,
+                        help="Export only the first N results (requires --sort-by)")
+    parser.add_argument("--sort-buffer", action="store", dest="sortbuffer", type=int, default=100000,
+                        help="Maximum number of devices kept in memory while sorting (default: 100000)")
+    parser.add_argument("--oui", action="store", dest="oui", nargs="?", const=get_default_path(), default=None,
+                        help="Resolve manufacturers with the offline OUI database (optional path, see kismet_analyzer_oui)")
+    parser.add_argument("--partition-by", action="store", dest="partitionby", default=None,
+                        help="Split the csv export into one file per partition ({0}) and write a manifest"
+                        .format(", ".join(p + ":N" if p == "geohash" else p for p in PARTITIONS)))
+    parser.add_argument("--max-open-files", action="store", dest="maxopen", type=int, default=64,
+                        help="Maximum number of partition files kept open at the same time (default: 64)")
     parameters = parser.parse_args()
 
+    if parameters.top is not None and parameters.sortby is None:
+        parser.error("--top requires --sort-by")
+
+    if parameters.partitionby is not None:
+        try:
+            partition.parse_partition(parameters.partitionby, PARTITIONS)
+        except ValueError as e:
+            parser.error("--partition-by: {0}".format(e))
+
     # set the filename prefix for the output file if it is not specified
     # via the parameter --out
     if parameters.outfile is None:
@@ -117,6 +261,51 @@ def gen_devlist():
         else:
             parameters.outfile = parameters.infile
 
+    # offline OUI database to fill in the manufacturer names
+    parameters.ouidb = None
+    if parameters.oui is not None:
+        parameters.ouidb = open_database(parameters.oui)
+
+    sql = "SELECT * FROM devices; "
+
+    if parameters.threads:
+        # run database reads, decoding and the exports in separate
+        # threads which are connected by bounded queues
+        consumers = []
+        if parameters.csv and parameters.partitionby:
+            consumers.append(lambda devs: export_csv_partitioned(parameters.outfile, devs, parameters.partitionby,
+                                                                 parameters.maxopen))
+        elif parameters.csv:
+            consumers.append(lambda devs: export_csv(parameters.outfile, devs))
+        if parameters.kml:
+            consumers.append(lambda devs: export_kml(parameters.outfile, parameters.title, devs))
+        if parameters.geojson:
+            consumers.append(lambda devs: export_geojson(parameters.outfile, devs))
+        if parameters.fgb:
+            consumers.append(lambda devs: export_fgb(parameters.outfile, parameters.title, devs))
+        if not consumers:
+            consumers.append(lambda devs: sum(1 for _ in devs))
+
+        fetch = fetch_rows(parameters.infile, sql)
+        decode = lambda row: get_device(row, parameters)
+        result = []
+        try:
+            if parameters.sortby:
+                # sorting needs all devices, so the exports are started
+                # once the sorted result is available
+                sort = lambda devs: result.append(sort_devices(devs, parameters.sortby, parameters.top,
+                                                               parameters.sortbuffer))
+                Pipeline(fetch, decode, [sort]).run()
+                fetch, decode = (lambda: iter(result[0])), (lambda dev: dev)
+            Pipeline(fetch, decode, consumers).run()
+        except Exception as e:
+            print("Failed to process kismet logfile: {0}".format(e))
+            sys.exit(1)
+        finally:
+            if result and isinstance(result[0], ExternalSort):
+                result[0].close()
+        return
+
     try:
         db = sqlite3.connect(parameters.infile)
     except Exception as e:
@@ -124,38 +313,37 @@ def gen_devlist():
         sys.exit(1)
 
     try:
-        sql = "SELECT * FROM devices; "
         c = db.cursor()
         sql_result = c.execute(sql)
     except:
         print("Failed to extract data from database")
         sys.exit()
 
-    # container for collecting relevant devices
-    devs = []
-    for row in sql_result:
-        try:
-            # create a device dictionary from json string stored in the
-            # device column of the kismet database
-            dev = json.loads(row[14])
-            # convert json device string into an instance of the
-            # class kismetanalyzer.model.AccessPoint
-            strongest = parameters.strongest
-            d = Device.from_json(dev, strongest)
-            if parameters.type is not None:
-                if parameters.type not in d.type:
-                    continue
-
-            if parameters.verbose:
-                print("{:20s}{:40s}{:10s}".format(d.mac, d.type, d.channel))
-
-            devs.append(d)
-
-        except Exception as e:
-            continue
+    # relevant devices (the rows are only decoded while iterating)
+    devs = (d for d in (get_device(row, parameters) for row in sql_result) if d is not None)
 
-    if parameters.csv:
-        export_csv(parameters.outfile, devs)
+    if parameters.sortby:
+        devs = sort_devices(devs, parameters.sortby, parameters.top, parameters.sortbuffer)
+    elif [parameters.csv, parameters.kml, parameters.geojson, parameters.fgb].count(True) != 1:
+        # the devices are exported more than once (or not at all, then the
+        # devices are only decoded, e.g. for --verbose)
+        devs = list(devs)
 
-    if parameters.kml:
-        export_kml(parameters.outfile, parameters.title, devs)
+    try:
+        if parameters.csv and parameters.partitionby:
+            export_csv_partitioned(parameters.outfile, devs, parameters.partitionby, parameters.maxopen)
+        elif parameters.csv:
+            export_csv(parameters.outfile, devs)
+
+        if parameters.kml:
+            export_kml(parameters.outfile, parameters.title, devs)
+
+        if parameters.geojson:
+            export_geojson(parameters.outfile, devs)
+
+        if parameters.fgb:
+            export_fgb(parameters.outfile, parameters.title, devs)
+    finally:
+        # remove the temporary files of the sort (also if an export fails)
+        if isinstance(devs, ExternalSort):
+            devs.close()
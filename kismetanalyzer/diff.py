@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+# Simple script to compare the access points of two kismet logfiles (e.g.
+# two site surveys). Both databases are read ordered by MAC address and
+# compared with a merge join, so only one access point per database is kept
+# in memory.
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import json
+import sqlite3
+import sys
+
+from kismetanalyzer.model import AccessPoint
+
+
+# attributes of an access point which are compared
+FIELDS = ["ssid", "encryption", "channel"]
+
+APPEARED = "appeared"
+DISAPPEARED = "disappeared"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def iter_accesspoints(db):
+    """
+    Iterate over the access points of a kismet database ordered by MAC
+    address.
+
+    :param db: sqlite connection
+
+    :return: iterator over tuples (mac, kismetanalyzer.model.AccessPoint)
+    """
+    sql = "SELECT UPPER(devmac), device FROM devices where type='Wi-Fi AP' ORDER BY UPPER(devmac); "
+    for row in db.execute(sql):
+        try:
+            ap = AccessPoint.from_json(json.loads(row[1]))
+        except Exception as e:
+            continue
+        yield row[0], ap
+
+
+def diff_accesspoints(old, new):
+    """
+    Compare two streams of access points ordered by MAC address.
+
+    :param old: iterator returned by iter_accesspoints() for the old capture
+    :param new: iterator returned by iter_accesspoints() for the new capture
+
+    :return: iterator over tuples (status, old_ap, new_ap, changed_fields).
+             old_ap is None for appeared access points, new_ap is None for
+             disappeared access points.
+    """
+    sentinel = (None, None)
+    old_mac, old_ap = next(old, sentinel)
+    new_mac, new_ap = next(new, sentinel)
+
+    while old_mac is not None or new_mac is not None:
+        if new_mac is None or (old_mac is not None and old_mac < new_mac):
+            yield DISAPPEARED, old_ap, None, []
+            old_mac, old_ap = next(old, sentinel)
+        elif old_mac is None or new_mac < old_mac:
+            yield APPEARED, None, new_ap, []
+            new_mac, new_ap = next(new, sentinel)
+        else:
+            changed = [f for f in FIELDS if getattr(old_ap, f) != getattr(new_ap, f)]
+            yield (CHANGED if changed else UNCHANGED), old_ap, new_ap, changed
+            old_mac, old_ap = next(old, sentinel)
+            new_mac, new_ap = next(new, sentinel)
+
+
+def get_record(status, old_ap, new_ap, changed):
+    """
+    Convert a result of diff_accesspoints() into a flat list of values.
+    """
+    ap = new_ap if new_ap is not None else old_ap
+    record = [status, ap.mac]
+    for ap in (new_ap, old_ap):
+        for f in FIELDS:
+            record.append(getattr(ap, f) if ap is not None else "")
+    record.append(",".join(changed))
+    return record
+
+
+HEADER = ['Status', 'MAC-Address', 'SSID', 'Encryption', 'Channel', 'Old-SSID', 'Old-Encryption',
+          'Old-Channel', 'Changed-Fields']
+
+
+def export_csv(filename, changes, delimiter=";"):
+    """
+    Export the differences to a CSV file. The filename prefix and the
+    differences are required. The delimiter is optional.
+
+    :param filename: Prefix for the filename. The extension "csv" will be added
+    :param changes: iterable of tuples returned by diff_accesspoints()
+    :param delimiter: Delimiter to use for separation of columns (optional)
+
+    :return: dictionary with the number of access points per status
+    """
+    import csv
+
+    counts = {}
+    outfile = "{0}-diff.csv".format(filename)
+
+    with open(outfile, mode='w') as csv_file:
+        w = csv.writer(csv_file, delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        w.writerow(HEADER)
+        for change in changes:
+            w.writerow(get_record(*change))
+            counts[change[0]] = counts.get(change[0], 0) + 1
+
+    print("Exported {} access points to {}".format(sum(counts.values()), outfile))
+    return counts
+
+
+def export_json(filename, changes):
+    """
+    Export the differences to a JSON file. The records are written one by
+    one, so the whole result is never kept in memory.
+
+    :param filename: Prefix for the filename. The extension "json" will be added
+    :param changes: iterable of tuples returned by diff_accesspoints()
+
+    :return: dictionary with the number of access points per status
+    """
+    counts = {}
+    outfile = "{0}-diff.json".format(filename)
+
+    with open(outfile, mode='w') as f:
+        f.write("[")
+        for change in changes:
+            if counts:
+                f.write(",")
+            f.write("\n  " + json.dumps(dict(zip(HEADER, get_record(*change)))))
+            counts[change[0]] = counts.get(change[0], 0) + 1
+        f.write("\n]\n")
+
+    print("Exported {} access points to {}".format(sum(counts.values()), outfile))
+    return counts
+
+
+def gen_diff():
+    parser = argparse.ArgumentParser(description="Compare the access points of two kismet logfiles.")
+    parser.add_argument("--old", action="store", dest="oldfile", required=True, help='Previous input file (.kismet)')
+    parser.add_argument("--new", action="store", dest="newfile", required=True, help='Current input file (.kismet)')
+    parser.add_argument("--out", action="store", dest="outfile", help='Output filename (optional)')
+    parser.add_argument("--json", action="store_true", dest="json", default=False,
+                        help="Export results to json instead of csv")
+    parser.add_argument("--all", action="store_true", dest="all", default=False,
+                        help="Include unchanged access points")
+    parameters = parser.parse_args()
+
+    # set the filename prefix for the output file if it is not specified
+    # via the parameter --out
+    if parameters.outfile is None:
+        if parameters.newfile.endswith(".kismet"):
+            parameters.outfile = parameters.newfile[:-7]
+        else:
+            parameters.outfile = parameters.newfile
+
+    try:
+        old_db = sqlite3.connect(parameters.oldfile)
+        new_db = sqlite3.connect(parameters.newfile)
+    except Exception as e:
+        print("Failed to open kismet logfile: {0}".format(e))
+        sys.exit(1)
+
+    changes = diff_accesspoints(iter_accesspoints(old_db), iter_accesspoints(new_db))
+    if not parameters.all:
+        changes = (c for c in changes if c[0] != UNCHANGED)
+
+    try:
+        if parameters.json:
+            counts = export_json(parameters.outfile, changes)
+        else:
+            counts = export_csv(parameters.outfile, changes)
+    except sqlite3.Error:
+        print("Failed to extract data from database")
+        sys.exit()
+
+    for status in (APPEARED, DISAPPEARED, CHANGED, UNCHANGED):
+        if status in counts:
+            print("{:20s}{:>10d}".format(status, counts[status]))
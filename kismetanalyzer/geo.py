@@ -0,0 +1,398 @@
+# This script contains streaming exporters for geographic formats:
+#
+#   GeoJSON Text Sequences (RFC 8142): one feature per record, each record
+#   is prefixed with the record separator (0x1e) and terminated by a newline.
+#
+#   FlatGeobuf (https://flatgeobuf.org): binary format with a packed Hilbert
+#   R-tree as spatial index, which allows web viewers to load only the
+#   features of the visible area with HTTP range requests.
+#
+# Both exporters write one feature after another. For FlatGeobuf the features
+# are written to a temporary file first, because the header and the spatial
+# index have to be written before the features. Only the bounding box and
+# the position of each feature are kept in memory for the index.
+#
+# @author Christoph Bless
+#
+import json
+import math
+import struct
+import tempfile
+
+
+# column types (see the enum ColumnType of the FlatGeobuf schema)
+INT = 5
+LONG = 7
+DOUBLE = 10
+STRING = 11
+
+# geometry type point (see the enum GeometryType of the FlatGeobuf schema)
+_POINT = 1
+
+_MAGIC = b"fgb\x03fgb\x00"
+_NODE_ITEM = struct.Struct("<4dQ")
+_HILBERT_MAX = (1 << 16) - 1
+
+
+def get_coordinates(dev):
+    """
+    Returns the coordinates (x, y) of an access point or device. The order
+    is the same as the one used by the KML exports.
+
+    :param dev: instance of kismetanalyzer.model.AccessPoint or Device
+
+    :return: tuple (x, y) as floats
+    """
+    loc = dev.location
+    return float(loc.lat), float(loc.lon)
+
+
+def get_properties(dev, columns):
+    """
+    Returns the attributes of a device as list of tuples (name, type, value)
+    for the given columns. Values which can't be converted into the type of
+    the column are set to None.
+
+    :param dev: instance of kismetanalyzer.model.AccessPoint or Device
+    :param columns: list of tuples (name, type, getter)
+    """
+    properties = []
+    for name, type_, getter in columns:
+        value = getter(dev)
+        try:
+            if value is None or value == "":
+                value = None
+            elif type_ == STRING:
+                value = str(value)
+            elif type_ == DOUBLE:
+                value = float(value)
+            else:
+                value = int(value)
+        except (TypeError, ValueError):
+            value = None
+        properties.append((name, type_, value))
+    return properties
+
+
+def export_geojsonseq(outfile, devices, columns):
+    """
+    Export devices as GeoJSON Text Sequence (RFC 8142).
+
+    :param outfile: name of the output file
+    :param devices: iterable of devices
+    :param columns: list of tuples (name, type, getter) which describe the
+                    exported attributes
+
+    :return: number of exported devices
+    :rtype: int
+    """
+    num_plotted = 0
+    with open(outfile, mode="w", encoding="utf-8") as f:
+        for dev in devices:
+            x, y = get_coordinates(dev)
+            feature = {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": dict((name, value) for name, _, value in get_properties(dev, columns)),
+            }
+            f.write("\x1e" + json.dumps(feature) + "\n")
+            num_plotted = num_plotted + 1
+    return num_plotted
+
+
+class _FlatBuffer(object):
+    """
+    Minimal FlatBuffers encoder which is sufficient for the FlatGeobuf
+    header and feature tables. The buffer is written front to back: each
+    table is preceded by its vtable and followed by its strings, vectors and
+    sub-tables, so all offsets point forward.
+
+    Tables are given as list of fields (index, kind, value). Supported
+    kinds: "bool", "ubyte", "ushort", "int", "ulong", "string", "table",
+    "doubles", "ubytes", "tables".
+    """
+
+    _SCALARS = {"bool": "<B", "ubyte": "<B", "ushort": "<H", "int": "<i", "ulong": "<Q"}
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def _pad(self, alignment, extra=0):
+        # pad so that len(buf) + extra is a multiple of alignment
+        self.buf.extend(b"\x00" * (-(len(self.buf) + extra) % alignment))
+
+    def _put_offset(self, pos, target):
+        struct.pack_into("<I", self.buf, pos, target - pos)
+
+    def finish(self, fields):
+        self.buf.extend(b"\x00" * 4)
+        self._put_offset(0, self.table(fields))
+        return bytes(self.buf)
+
+    def table(self, fields):
+        fields = [f for f in fields if f[2] is not None]
+        num_slots = max([f[0] for f in fields] + [-1]) + 1
+
+        # vtable
+        self._pad(2)
+        vtable = len(self.buf)
+        self.buf.extend(b"\x00" * (4 + 2 * num_slots))
+
+        # inline part of the table, largest fields first
+        sizes = []
+        for index, kind, value in fields:
+            fmt = self._SCALARS.get(kind)
+            sizes.append(struct.calcsize(fmt) if fmt else 4)
+        self._pad(8 if 8 in sizes else 4)
+        table = len(self.buf)
+        self.buf.extend(b"\x00" * 4)
+        positions = {}
+        for size, (index, kind, value) in sorted(zip(sizes, fields), key=lambda f: -f[0]):
+            self._pad(size)
+            positions[index] = len(self.buf)
+            fmt = self._SCALARS.get(kind)
+            if fmt:
+                self.buf.extend(struct.pack(fmt, value))
+            else:
+                self.buf.extend(b"\x00" * 4)
+
+        struct.pack_into("<HH", self.buf, vtable, 4 + 2 * num_slots, len(self.buf) - table)
+        for index, pos in positions.items():
+            struct.pack_into("<H", self.buf, vtable + 4 + 2 * index, pos - table)
+        struct.pack_into("<i", self.buf, table, table - vtable)
+
+        # referenced objects
+        for index, kind, value in fields:
+            if kind in self._SCALARS:
+                continue
+            if kind == "string":
+                target = self.vector(1, value.encode("utf-8") + b"\x00", len(value.encode("utf-8")))
+            elif kind == "ubytes":
+                target = self.vector(1, bytes(value), len(value))
+            elif kind == "doubles":
+                target = self.vector(8, struct.pack("<{0}d".format(len(value)), *value), len(value))
+            elif kind == "tables":
+                target = self.vector(4, b"\x00" * (4 * len(value)), len(value))
+                for i, sub in enumerate(value):
+                    self._put_offset(target + 4 + 4 * i, self.table(sub))
+            else:
+                target = self.table(value)
+            self._put_offset(positions[index], target)
+        return table
+
+    def vector(self, alignment, data, length):
+        # the length prefix is followed by the elements, which have to be
+        # aligned to their size
+        self._pad(max(alignment, 4), 4)
+        pos = len(self.buf)
+        self.buf.extend(struct.pack("<I", length))
+        self.buf.extend(data)
+        return pos
+
+
+def _hilbert(x, y):
+    # Hilbert curve index of a point on a 2^16 x 2^16 grid (the same
+    # algorithm is used by the FlatGeobuf reference implementation)
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return (i1 << 1) | i0
+
+
+def _level_bounds(num_items, node_size):
+    """
+    Returns the (start, end) positions of the nodes of each level of the
+    packed R-tree, starting with the leaves. The root is stored first.
+    """
+    n = num_items
+    level_num_nodes = [n]
+    num_nodes = n
+    while True:
+        n = (n + node_size - 1) // node_size
+        num_nodes += n
+        level_num_nodes.append(n)
+        if n == 1:
+            break
+    bounds = []
+    n = num_nodes
+    for size in level_num_nodes:
+        bounds.append((n - size, n))
+        n -= size
+    return bounds, num_nodes
+
+
+def _write_index(f, items, node_size):
+    """
+    Write the packed Hilbert R-tree. items must be sorted in the order of
+    the features and contain tuples (x, y, offset) where offset is the
+    position of the feature relative to the start of the feature data.
+    """
+    bounds, num_nodes = _level_bounds(len(items), node_size)
+    nodes = [None] * num_nodes
+    leaf_start = bounds[0][0]
+    for i, (x, y, offset) in enumerate(items):
+        nodes[leaf_start + i] = (x, y, x, y, offset)
+
+    for level in range(len(bounds) - 1):
+        pos, end = bounds[level]
+        newpos = bounds[level + 1][0]
+        while pos < end:
+            first = pos
+            min_x = min_y = float("inf")
+            max_x = max_y = float("-inf")
+            for _ in range(node_size):
+                if pos >= end:
+                    break
+                n = nodes[pos]
+                min_x, min_y = min(min_x, n[0]), min(min_y, n[1])
+                max_x, max_y = max(max_x, n[2]), max(max_y, n[3])
+                pos += 1
+            nodes[newpos] = (min_x, min_y, max_x, max_y, first)
+            newpos += 1
+
+    for n in nodes:
+        f.write(_NODE_ITEM.pack(*n))
+
+
+def _encode_properties(properties):
+    data = bytearray()
+    for i, (_, type_, value) in enumerate(properties):
+        if value is None:
+            continue
+        data.extend(struct.pack("<H", i))
+        if type_ == STRING:
+            encoded = value.encode("utf-8")
+            data.extend(struct.pack("<I", len(encoded)))
+            data.extend(encoded)
+        elif type_ == DOUBLE:
+            data.extend(struct.pack("<d", value))
+        elif type_ == LONG:
+            data.extend(struct.pack("<q", value))
+        else:
+            data.extend(struct.pack("<i", value))
+    return data
+
+
+def _encode_feature(x, y, properties):
+    geometry = [(1, "doubles", [x, y]), (6, "ubyte", _POINT)]
+    fb = _FlatBuffer()
+    return fb.finish([(0, "table", geometry), (1, "ubytes", _encode_properties(properties))])
+
+
+def _encode_header(title, columns, count, envelope, node_size):
+    column_tables = [[(0, "string", name), (1, "ubyte", type_)] for name, type_, _ in columns]
+    crs = [(0, "string", "EPSG"), (1, "int", 4326)]
+    fields = [
+        (0, "string", title),
+        (1, "doubles", envelope),
+        (2, "ubyte", _POINT),
+        (7, "tables", column_tables),
+        (8, "ulong", count),
+        (9, "ushort", node_size),
+        (10, "table", crs),
+    ]
+    return _FlatBuffer().finish(fields)
+
+
+def export_flatgeobuf(outfile, title, devices, columns, node_size=16):
+    """
+    Export devices as FlatGeobuf file with a packed Hilbert R-tree index.
+
+    :param outfile: name of the output file
+    :param title: name which will be added to the header
+    :param devices: iterable of devices
+    :param columns: list of tuples (name, type, getter) which describe the
+                    exported attributes
+    :param node_size: number of children per node of the spatial index
+
+    :return: number of exported devices
+    :rtype: int
+    """
+    # entries (hilbert value, x, y, position, size) of the features in the
+    # temporary file
+    items = []
+    with tempfile.TemporaryFile(prefix="kismetanalyzer-fgb-") as tmp:
+        pos = 0
+        for dev in devices:
+            x, y = get_coordinates(dev)
+            feature = _encode_feature(x, y, get_properties(dev, columns))
+            tmp.write(struct.pack("<I", len(feature)))
+            tmp.write(feature)
+            items.append([0, x, y, pos, len(feature) + 4])
+            pos += len(feature) + 4
+
+        if items:
+            envelope = [min(i[1] for i in items), min(i[2] for i in items),
+                        max(i[1] for i in items), max(i[2] for i in items)]
+        else:
+            envelope = None
+            node_size = 0
+
+        # sort the features along the hilbert curve
+        if items:
+            width = envelope[2] - envelope[0]
+            height = envelope[3] - envelope[1]
+            for item in items:
+                hx = int(math.floor(_HILBERT_MAX * (item[1] - envelope[0]) / width)) if width else 0
+                hy = int(math.floor(_HILBERT_MAX * (item[2] - envelope[1]) / height)) if height else 0
+                item[0] = _hilbert(hx, hy)
+            items.sort(key=lambda i: i[0])
+
+        with open(outfile, "wb") as f:
+            f.write(_MAGIC)
+            header = _encode_header(title, columns, len(items), envelope, node_size)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+
+            if items:
+                offset = 0
+                leaves = []
+                for _, x, y, _, size in items:
+                    leaves.append((x, y, offset))
+                    offset += size
+                _write_index(f, leaves, node_size)
+
+            for _, _, _, pos, size in items:
+                tmp.seek(pos)
+                f.write(tmp.read(size))
+
+    return len(items)
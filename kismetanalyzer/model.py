@@ -1,5 +1,6 @@
 from kismetanalyzer.util import parse_encryption, parse_channel, parse_loc, parse_frequency, parse_networkname, \
-    parse_manufacturer, parse_mac, parse_clientmap, parse_name, parse_type, parse_phyname, parse_commonname
+    parse_manufacturer, parse_mac, parse_clientmap, parse_name, parse_type, parse_phyname, parse_commonname, \
+    parse_probed_ssids, parse_first_time, parse_last_time, is_locally_administered, parse_signal
 
 class Location(object):
 
@@ -39,7 +40,7 @@ class Location(object):
 class AccessPoint(object):
 
     def __init__(self, ssid="", mac="", encryption="", location = None, frequency="", channel="",
-                 manufacturer="", client_map=[]):
+                 manufacturer="", client_map=[], signal="", last_time=0):
         self._ssid = ssid
         self._mac = mac
         self._encryption = encryption
@@ -48,6 +49,8 @@ class AccessPoint(object):
         self._channel = channel
         self._manufacturer = manufacturer
         self._client_map = client_map
+        self._signal = signal
+        self._last_time = last_time
 
     @property
     def ssid(self):
@@ -115,6 +118,22 @@ class AccessPoint(object):
     def client_map(self, value=[]):
         self._client_map = value
 
+    @property
+    def signal(self):
+        return self._signal
+
+    @signal.setter
+    def signal(self, value=""):
+        self._signal = value
+
+    @property
+    def last_time(self):
+        return self._last_time
+
+    @last_time.setter
+    def last_time(self, value=0):
+        self._last_time = value
+
 
     @classmethod
     def from_json(cls, dev, strongest=False):
@@ -129,13 +148,94 @@ class AccessPoint(object):
         ap.channel = parse_channel(dev)
         ap.manufacturer = parse_manufacturer(dev)
         ap._client_map = parse_clientmap(dev)
+        ap.signal = parse_signal(dev)
+        ap.last_time = parse_last_time(dev)
         return ap
 
 
+
+class AccessPointCluster(AccessPoint):
+    """
+    Summary of several co-located access points with the same SSID. The MAC
+    address, frequency, channel and signal are taken from the strongest
+    member, the location is the centroid of the members.
+    """
+
+    def __init__(self, members=[], **kwargs):
+        super(AccessPointCluster, self).__init__(**kwargs)
+        self._members = members
+
+    @property
+    def members(self):
+        return self._members
+
+    @members.setter
+    def members(self, value=[]):
+        self._members = value
+
+    @property
+    def member_macs(self):
+        return [ap.mac for ap in self._members]
+
+    @property
+    def encryption_mix(self):
+        """
+        Returns the encryption types of the members as list of tuples
+        (encryption, count), most frequent first.
+        """
+        counts = {}
+        for ap in self._members:
+            counts[ap.encryption] = counts.get(ap.encryption, 0) + 1
+        return sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+
+    @property
+    def channels(self):
+        return sorted(set(str(ap.channel) for ap in self._members if ap.channel != ""))
+
+
+    @classmethod
+    def from_accesspoints(cls, aps):
+        def signal(ap):
+            return ap.signal if isinstance(ap.signal, (int, float)) else float("-inf")
+
+        strongest = max(aps, key=signal)
+        c = AccessPointCluster(members=list(aps))
+        c.ssid = strongest.ssid
+        c.mac = strongest.mac
+        c.encryption = ", ".join("{0} ({1})".format(enc, n) for enc, n in c.encryption_mix)
+        c.frequency = strongest.frequency
+        c.channel = strongest.channel
+        c.manufacturer = strongest.manufacturer
+        c.signal = strongest.signal
+        c.last_time = max(ap.last_time for ap in aps)
+
+        clients = []
+        seen = set()
+        for ap in aps:
+            for mac in ap.client_map:
+                if mac not in seen:
+                    seen.add(mac)
+                    clients.append(mac)
+        c.client_map = clients
+
+        # centroid of the members with location (the coordinates are stored
+        # in the same way as parsed by kismetanalyzer.util.parse_loc)
+        located = [ap.location for ap in aps
+                   if ap.location is not None and (float(ap.location.lat) != 0 or float(ap.location.lon) != 0)]
+        if located:
+            c.location = Location(sum(float(l.lon) for l in located) / len(located),
+                                  sum(float(l.lat) for l in located) / len(located),
+                                  sum(float(l.alt) for l in located) / len(located))
+        else:
+            c.location = Location()
+        return c
+
+
 class Device(object):
 
     def __init__(self, name="", commonname="", phyname="", location = None, frequency="", channel="",
-                 manufacturer="", mac ="", type=""):
+                 manufacturer="", mac ="", type="", signal="", last_time=0,
+                 client_map=[]):
         self._name = name
         self._commonname = commonname
         self._phyname = phyname
@@ -145,6 +245,9 @@ class Device(object):
         self._frequency = frequency
         self._channel = channel
         self._manufacturer = manufacturer
+        self._signal = signal
+        self._last_time = last_time
+        self._client_map = client_map
 
     @property
     def name(self):
@@ -221,6 +324,30 @@ class Device(object):
     def manufacturer(self, value):
         self._manufacturer = value
 
+    @property
+    def signal(self):
+        return self._signal
+
+    @signal.setter
+    def signal(self, value=""):
+        self._signal = value
+
+    @property
+    def last_time(self):
+        return self._last_time
+
+    @last_time.setter
+    def last_time(self, value=0):
+        self._last_time = value
+
+    @property
+    def client_map(self):
+        return self._client_map
+
+    @client_map.setter
+    def client_map(self, value=[]):
+        self._client_map = value
+
 
     @classmethod
     def from_json(cls, dev, strongest=False):
@@ -237,4 +364,72 @@ class Device(object):
         d.name = parse_name(dev)
         d.commonname = parse_commonname(dev)
         d.phyname = parse_phyname(dev)
+        d.signal = parse_signal(dev)
+        d.last_time = parse_last_time(dev)
+        d.client_map = parse_clientmap(dev)
         return d
+
+
+class Client(object):
+
+    def __init__(self, mac="", manufacturer="", probed_ssids=[], first_time=0, last_time=0):
+        self._mac = mac
+        self._manufacturer = manufacturer
+        self._probed_ssids = probed_ssids
+        self._first_time = first_time
+        self._last_time = last_time
+
+    @property
+    def mac(self):
+        return self._mac
+
+    @mac.setter
+    def mac(self, value=""):
+        self._mac = value
+
+    @property
+    def manufacturer(self):
+        return self._manufacturer
+
+    @manufacturer.setter
+    def manufacturer(self, value):
+        self._manufacturer = value
+
+    @property
+    def probed_ssids(self):
+        return self._probed_ssids
+
+    @probed_ssids.setter
+    def probed_ssids(self, value=[]):
+        self._probed_ssids = value
+
+    @property
+    def first_time(self):
+        return self._first_time
+
+    @first_time.setter
+    def first_time(self, value=0):
+        self._first_time = value
+
+    @property
+    def last_time(self):
+        return self._last_time
+
+    @last_time.setter
+    def last_time(self, value=0):
+        self._last_time = value
+
+    @property
+    def randomized(self):
+        return is_locally_administered(self._mac)
+
+
+    @classmethod
+    def from_json(cls, dev):
+        c = Client()
+        c.mac = parse_mac(dev)
+        c.manufacturer = parse_manufacturer(dev)
+        c.probed_ssids = parse_probed_ssids(dev)
+        c.first_time = parse_first_time(dev)
+        c.last_time = parse_last_time(dev)
+        return c
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+# This script contains an offline lookup of the manufacturer for a MAC
+# address. The IEEE registries (MA-L, MA-M and MA-S) are converted into a
+# compact sorted binary file, which is memory-mapped and searched with
+# bisection on the 24, 28 and 36 bit prefixes of the MAC address.
+#
+# The registries can be downloaded from:
+#   https://standards-oui.ieee.org/oui/oui.csv       (MA-L, 24 bit)
+#   https://standards-oui.ieee.org/oui28/mam.csv     (MA-M, 28 bit)
+#   https://standards-oui.ieee.org/oui36/oui36.csv   (MA-S, 36 bit)
+#
+# File format (little endian):
+#   header:   magic, then (offset, count) for the 36, 28 and 24 bit
+#             sections, then the offset of the name table (padded to 40
+#             bytes, so that the prefixes are aligned to 8 bytes)
+#   section:  count sorted prefixes (uint64) followed by count offsets
+#             (uint32) into the name table
+#   names:    null terminated UTF-8 strings
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import bisect
+import csv
+import mmap
+import os
+import struct
+import sys
+from functools import lru_cache
+
+from kismetanalyzer.util import is_locally_administered
+
+
+MAGIC = b"KAOUI\x00\x01\x00"
+HEADER = struct.Struct("<8s7I4x")
+
+# prefix length in bits for each registry, longest prefix first
+REGISTRIES = [("MA-S", 36), ("MA-M", 28), ("MA-L", 24)]
+
+# manufacturer name used for locally administered (e.g. randomized) MACs
+LOCALLY_ADMINISTERED = "Locally administered"
+
+
+def get_default_path():
+    """
+    Returns the path of the OUI database. It can be set with the environment
+    variable KISMETANALYZER_OUI, otherwise ~/.kismetanalyzer/oui.bin is used.
+    """
+    return os.environ.get("KISMETANALYZER_OUI",
+                          os.path.join(os.path.expanduser("~"), ".kismetanalyzer", "oui.bin"))
+
+
+def mac_to_prefix(mac):
+    """
+    Convert the first 36 bits of a MAC address (e.g. "00:11:22:33:44:55")
+    into an integer.
+
+    :raises ValueError: if the MAC address is invalid
+    """
+    digits = mac[:14].replace(":", "").replace("-", "").replace(".", "")[:9]
+    if len(digits) != 9:
+        raise ValueError("invalid MAC address: {0}".format(mac))
+    return int(digits, 16)
+
+
+def read_registry(filename):
+    """
+    Read an IEEE registry csv file (columns: Registry, Assignment,
+    Organization Name, Organization Address).
+
+    :param filename: path to oui.csv, mam.csv or oui36.csv
+
+    :return: iterator over tuples (registry, assignment, organization)
+    """
+    with open(filename, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if len(row) < 3 or row[0] == "Registry":
+                continue
+            yield row[0].strip(), row[1].strip(), row[2].strip()
+
+
+def build_database(outfile, registry_files):
+    """
+    Build the binary OUI database from the IEEE registry csv files.
+
+    :param outfile: path of the binary file
+    :param registry_files: list of IEEE registry csv files
+
+    :return: number of prefixes written to the database
+    :rtype: int
+    """
+    sections = dict((bits, {}) for _, bits in REGISTRIES)
+    bits_by_registry = dict(REGISTRIES)
+    for filename in registry_files:
+        for registry, assignment, organization in read_registry(filename):
+            bits = bits_by_registry.get(registry)
+            if bits is None or len(assignment) * 4 != bits:
+                continue
+            sections[bits][int(assignment, 16)] = organization
+
+    # name table with deduplicated names
+    names = bytearray()
+    name_offsets = {}
+    for bits in sections:
+        for organization in sections[bits].values():
+            if organization not in name_offsets:
+                name_offsets[organization] = len(names)
+                names.extend(organization.encode("utf-8") + b"\x00")
+
+    body = bytearray()
+    header_values = []
+    for _, bits in REGISTRIES:
+        prefixes = sorted(sections[bits])
+        offset = HEADER.size + len(body)
+        header_values.extend([offset, len(prefixes)])
+        body.extend(struct.pack("<{0}Q".format(len(prefixes)), *prefixes))
+        body.extend(struct.pack("<{0}I".format(len(prefixes)),
+                                *[name_offsets[sections[bits][p]] for p in prefixes]))
+        # keep the next section aligned to 8 bytes
+        body.extend(b"\x00" * (-len(body) % 8))
+    header_values.append(HEADER.size + len(body))
+
+    directory = os.path.dirname(outfile)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(outfile, "wb") as f:
+        f.write(HEADER.pack(MAGIC, *header_values))
+        f.write(body)
+        f.write(names)
+
+    return sum(len(s) for s in sections.values())
+
+
+class _Prefixes(object):
+    """
+    Read-only sequence over the little endian prefixes of a section. Only
+    used on big endian hosts where the memoryview can't be cast directly.
+    """
+
+    def __init__(self, buf, offset, count):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        return struct.unpack_from("<Q", self._buf, self._offset + i * 8)[0]
+
+
+class OUIDatabase(object):
+    """
+    Memory-mapped OUI database created by build_database(). Opening the
+    database only maps the file and reads the header, the prefixes are
+    searched directly in the mapped file.
+    """
+
+    def __init__(self, filename):
+        self._sections = []
+        self._view = None
+        self._file = open(filename, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        values = HEADER.unpack_from(self._mm, 0)
+        if values[0] != MAGIC:
+            self.close()
+            raise ValueError("{0} is not an OUI database".format(filename))
+
+        self._view = view = memoryview(self._mm)
+        for i, (_, bits) in enumerate(REGISTRIES):
+            offset, count = values[1 + 2 * i], values[2 + 2 * i]
+            if sys.byteorder == "little":
+                prefixes = view[offset:offset + count * 8].cast("Q")
+                names = view[offset + count * 8:offset + count * 12].cast("I")
+            else:
+                prefixes = _Prefixes(self._mm, offset, count)
+                names = [struct.unpack_from("<I", self._mm, offset + count * 8 + j * 4)[0] for j in range(count)]
+            self._sections.append((48 - bits, prefixes, names))
+        self._names = values[7]
+        self._lookup = lru_cache(maxsize=65536)(self._lookup_prefix)
+
+    def _get_name(self, offset):
+        start = self._names + offset
+        end = self._mm.find(b"\x00", start)
+        return self._mm[start:end].decode("utf-8")
+
+    def _lookup_prefix(self, prefix36):
+        value = prefix36 << 12
+        for shift, prefixes, names in self._sections:
+            p = value >> shift
+            i = bisect.bisect_left(prefixes, p)
+            if i < len(prefixes) and prefixes[i] == p:
+                return self._get_name(names[i])
+        return None
+
+    def lookup(self, mac):
+        """
+        Lookup the organization which owns the MAC address. The longest
+        matching prefix (MA-S before MA-M before MA-L) is used.
+
+        :param mac: MAC address as string
+
+        :return: organization name or None if the prefix is not registered
+        :rtype: string
+        """
+        try:
+            return self._lookup(mac_to_prefix(mac))
+        except ValueError:
+            return None
+
+    def resolve(self, mac, default=""):
+        """
+        Resolve the manufacturer of a MAC address. Locally administered MACs
+        are marked as such, unknown prefixes keep the default value (e.g.
+        the manufacturer reported by kismet).
+
+        :param mac: MAC address as string
+        :param default: value returned if the prefix is not registered
+
+        :return: manufacturer name
+        :rtype: string
+        """
+        if is_locally_administered(mac):
+            return LOCALLY_ADMINISTERED
+        name = self.lookup(mac)
+        if name is None:
+            return default
+        return name
+
+    def close(self):
+        # the memoryviews must be released before the file can be unmapped
+        for _, prefixes, names in self._sections:
+            for v in (prefixes, names):
+                if isinstance(v, memoryview):
+                    v.release()
+        self._sections = []
+        if self._view is not None:
+            self._view.release()
+        self._mm.close()
+        self._file.close()
+
+
+def open_database(filename):
+    """
+    Open the OUI database or exit with an error message. This is used by
+    the command line scripts for the parameter --oui.
+
+    :param filename: path to the binary OUI database
+
+    :return: instance of OUIDatabase
+    """
+    try:
+        return OUIDatabase(filename)
+    except Exception as e:
+        print("Failed to open OUI database: {0}".format(e))
+        sys.exit(1)
+
+
+def gen_ouidb():
+    parser = argparse.ArgumentParser(description="Build or query the offline OUI database.")
+    parser.add_argument("--db", action="store", dest="db", default=get_default_path(),
+                        help='OUI database file (default: $KISMETANALYZER_OUI or ~/.kismetanalyzer/oui.bin)')
+    parser.add_argument("--build", action="store", dest="build", nargs="+", metavar="CSV",
+                        help='Build the database from the IEEE registry files (oui.csv, mam.csv, oui36.csv)')
+    parser.add_argument("mac", nargs="*", help='MAC addresses to look up')
+    parameters = parser.parse_args()
+
+    if parameters.build:
+        try:
+            count = build_database(parameters.db, parameters.build)
+        except Exception as e:
+            print("Failed to build OUI database: {0}".format(e))
+            sys.exit(1)
+        print("Exported {} prefixes to {}".format(count, parameters.db))
+
+    if parameters.mac:
+        db = open_database(parameters.db)
+        for mac in parameters.mac:
+            print("{:20s}{}".format(mac, db.resolve(mac, "Unknown")))
+        db.close()
@@ -0,0 +1,241 @@
+# This script contains the partitioned (sharded) csv export. Each record is
+# routed to the file of its partition while the devices are exported, e.g. one
+# file per geohash cell or per channel. Only a limited number of files is kept
+# open at the same time (least recently used files are closed and reopened in
+# append mode when needed). A manifest with the number of rows and the
+# bounding box of each shard is written at the end.
+#
+# @author Christoph Bless
+#
+import csv
+import json
+import re
+from collections import OrderedDict
+
+from kismetanalyzer import geo
+from kismetanalyzer.util import get_encryption_class
+
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# partition used for records without the partition attribute (e.g. devices
+# without location or channel)
+UNKNOWN = "unknown"
+
+
+def geohash_encode(lat, lon, precision=5):
+    """
+    Returns the geohash of a position.
+
+    :param lat: latitude
+    :param lon: longitude
+    :param precision: number of characters of the geohash (1-12)
+
+    :return: geohash string
+    :rtype: str
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    result = []
+    bits = 0
+    value = 0
+    even = True
+    while len(result) < precision:
+        # even bits encode the longitude, odd bits the latitude
+        r, v = (lon_range, lon) if even else (lat_range, lat)
+        mid = (r[0] + r[1]) / 2
+        if v >= mid:
+            value = (value << 1) | 1
+            r[0] = mid
+        else:
+            value = value << 1
+            r[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            result.append(_GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(result)
+
+
+def _geohash_key(precision):
+    def key(dev):
+        x, y = geo.get_coordinates(dev)
+        if x == 0 and y == 0:
+            return UNKNOWN
+        return geohash_encode(y, x, precision)
+    return key
+
+
+def _attribute_key(getter):
+    def key(dev):
+        value = getter(dev)
+        if value is None or value == "":
+            return UNKNOWN
+        return str(value)
+    return key
+
+
+PARTITION_KEYS = {
+    "channel": _attribute_key(lambda dev: dev.channel),
+    "type": _attribute_key(lambda dev: dev.type),
+    "encryption": _attribute_key(lambda dev: get_encryption_class(dev.encryption)),
+}
+
+
+def parse_partition(spec, allowed):
+    """
+    Returns the key function for a partition specification, e.g. "geohash:5"
+    or "channel".
+
+    :param spec: partition specification given on the command line
+    :param allowed: list of the allowed partition names
+
+    :return: function which returns the partition of a device
+    :raises ValueError: if the specification is invalid
+    """
+    name, _, arg = spec.partition(":")
+    if name not in allowed:
+        raise ValueError("unsupported partition '{0}' (use {1})".format(name, ", ".join(allowed)))
+    if name == "geohash":
+        try:
+            precision = int(arg) if arg else 5
+        except ValueError:
+            raise ValueError("invalid geohash precision '{0}'".format(arg))
+        if not 1 <= precision <= 12:
+            raise ValueError("the geohash precision must be between 1 and 12")
+        return _geohash_key(precision)
+    if arg:
+        raise ValueError("partition '{0}' takes no argument".format(name))
+    return PARTITION_KEYS[name]
+
+
+def get_shard_filename(prefix, partition):
+    """
+    Returns the filename of a shard. Characters which are not safe in
+    filenames are replaced by "_".
+    """
+    return "{0}-{1}.csv".format(prefix, re.sub(r"[^A-Za-z0-9._-]+", "_", partition))
+
+
+class PartitionWriter(object):
+    """
+    Writes csv rows to one file per partition with a bounded pool of open
+    file handles. If the filenames of two partitions are the same (e.g.
+    "6HT40+" and "6HT40_"), a number is added to the filename of the later
+    partition.
+    """
+
+    def __init__(self, prefix, header, max_open=64, delimiter=";"):
+        self._prefix = prefix
+        self._header = header
+        self._max_open = max(1, max_open)
+        self._delimiter = delimiter
+        self._open = OrderedDict()
+        self._filenames = set()
+        self.shards = OrderedDict()
+
+    def _get_filename(self, partition):
+        # the filenames are compared case insensitive (case insensitive
+        # file systems)
+        filename = get_shard_filename(self._prefix, partition)
+        base, num = filename[:-4], 2
+        while filename.lower() in self._filenames:
+            filename = "{0}-{1}.csv".format(base, num)
+            num += 1
+        self._filenames.add(filename.lower())
+        return filename
+
+    def _get_writer(self, partition):
+        if partition in self._open:
+            self._open.move_to_end(partition)
+            return self._open[partition][1]
+
+        if len(self._open) >= self._max_open:
+            # close the least recently used file
+            _, (f, _) = self._open.popitem(last=False)
+            f.close()
+
+        shard = self.shards.get(partition)
+        if shard is None:
+            shard = {"partition": partition, "file": self._get_filename(partition), "rows": 0, "bbox": None}
+            self.shards[partition] = shard
+            f = open(shard["file"], mode='w')
+            w = csv.writer(f, delimiter=self._delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            w.writerow(self._header)
+        else:
+            f = open(shard["file"], mode='a')
+            w = csv.writer(f, delimiter=self._delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        self._open[partition] = (f, w)
+        return w
+
+    def write(self, partition, row, x=0.0, y=0.0):
+        """
+        Append a row to the shard of the given partition.
+
+        :param partition: name of the partition
+        :param row: list of column values
+        :param x: x coordinate of the record (used for the bounding box)
+        :param y: y coordinate of the record (used for the bounding box)
+        """
+        self._get_writer(partition).writerow(row)
+        shard = self.shards[partition]
+        shard["rows"] += 1
+        if x == 0 and y == 0:
+            # record without location
+            return
+        bbox = shard["bbox"]
+        if bbox is None:
+            shard["bbox"] = [x, y, x, y]
+        else:
+            bbox[0] = min(bbox[0], x)
+            bbox[1] = min(bbox[1], y)
+            bbox[2] = max(bbox[2], x)
+            bbox[3] = max(bbox[3], y)
+
+    def close(self):
+        for f, _ in self._open.values():
+            f.close()
+        self._open.clear()
+
+    def write_manifest(self, outfile, partition_by):
+        """
+        Write the manifest (partition, file, number of rows and bounding box
+        [min x, min y, max x, max y] of each shard) as json file.
+        """
+        manifest = {
+            "partition_by": partition_by,
+            "rows": sum(s["rows"] for s in self.shards.values()),
+            "shards": sorted(self.shards.values(), key=lambda s: s["partition"]),
+        }
+        with open(outfile, mode='w') as f:
+            json.dump(manifest, f, indent=2)
+
+
+def export_partitioned(prefix, devices, header, get_row, partition_by, key, max_open=64):
+    """
+    Export devices to one csv file per partition and write the manifest
+    "<prefix>-manifest.json".
+
+    :param prefix: prefix of the shard files (e.g. "<out>-aplist")
+    :param devices: iterable of devices
+    :param header: list of column names
+    :param get_row: function which returns the csv row of a device
+    :param partition_by: partition specification (stored in the manifest)
+    :param key: function which returns the partition of a device
+    :param max_open: maximum number of open files
+
+    :return: tuple (number of exported devices, number of shards, manifest filename)
+    """
+    writer = PartitionWriter(prefix, header, max_open)
+    try:
+        for dev in devices:
+            x, y = geo.get_coordinates(dev)
+            writer.write(key(dev), get_row(dev), x, y)
+    finally:
+        writer.close()
+
+    manifest = "{0}-manifest.json".format(prefix)
+    writer.write_manifest(manifest, partition_by)
+    return sum(s["rows"] for s in writer.shards.values()), len(writer.shards), manifest
@@ -0,0 +1,186 @@
+# This script contains a small threaded pipeline which is used by the
+# command line scripts to overlap reading from the kismet database, decoding
+# of the json strings and the export of the results.
+#
+# @author Christoph Bless
+#
+import sqlite3
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+# marker which is put into a queue after the last batch
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """
+    Raised inside a stage when another stage of the pipeline has failed.
+    """
+    pass
+
+
+class Pipeline(object):
+    """
+    Connects the stages fetch -> decode -> consumers with bounded queues.
+    Each stage runs in its own thread. Rows and decoded objects are passed
+    in batches to keep the queue overhead low. If a queue is full the
+    producing stage blocks (backpressure), so the memory usage is bounded
+    by queue_size * batch_size objects per queue.
+
+    If one stage fails, all other stages are stopped and the first error
+    is raised by run().
+    """
+
+    def __init__(self, fetch, decode, consumers, queue_size=16, batch_size=500):
+        """
+        :param fetch: callable without arguments which returns an iterator
+                      over the database rows. It is called in the fetch
+                      thread, so sqlite connections must be opened inside.
+        :param decode: callable which converts a row into an object. If it
+                       returns None, the row is skipped.
+        :param consumers: list of callables which accept an iterable of
+                          decoded objects (e.g. export_csv, export_kml).
+                          Objects which are not read by a consumer are
+                          discarded after it has returned.
+        :param queue_size: maximum number of batches per queue
+        :param batch_size: number of rows / objects per batch
+        """
+        self._fetch = fetch
+        self._decode = decode
+        self._consumers = consumers
+        self._batch_size = batch_size
+        self._rows = queue.Queue(queue_size)
+        self._outputs = [queue.Queue(queue_size) for _ in consumers]
+        self._abort = threading.Event()
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def _fail(self, e):
+        with self._lock:
+            if not isinstance(e, PipelineAborted):
+                self._errors.append(e)
+        self._abort.set()
+
+    def _put(self, q, item):
+        # block until there is space in the queue, but give up if another
+        # stage has failed in the meantime
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _run_fetch(self):
+        try:
+            batch = []
+            for row in self._fetch():
+                batch.append(row)
+                if len(batch) >= self._batch_size:
+                    self._put(self._rows, batch)
+                    batch = []
+            if batch:
+                self._put(self._rows, batch)
+            self._put(self._rows, _DONE)
+        except Exception as e:
+            self._fail(e)
+
+    def _run_decode(self):
+        try:
+            while True:
+                batch = self._get(self._rows)
+                if batch is _DONE:
+                    break
+                result = []
+                for row in batch:
+                    obj = self._decode(row)
+                    if obj is not None:
+                        result.append(obj)
+                if result:
+                    for q in self._outputs:
+                        self._put(q, result)
+            for q in self._outputs:
+                self._put(q, _DONE)
+        except Exception as e:
+            self._fail(e)
+
+    def _iter_output(self, q, finished):
+        while True:
+            batch = self._get(q)
+            if batch is _DONE:
+                finished.set()
+                return
+            for obj in batch:
+                yield obj
+
+    def _run_consumer(self, consumer, q):
+        try:
+            finished = threading.Event()
+            consumer(self._iter_output(q, finished))
+            # a consumer which doesn't read all objects (e.g. only the first
+            # n) must not block the decode stage, so the rest is discarded
+            while not finished.is_set():
+                if self._get(q) is _DONE:
+                    finished.set()
+        except Exception as e:
+            self._fail(e)
+
+    def run(self):
+        """
+        Start all stages and wait until they have finished.
+
+        :return: None
+        :raises: the first exception raised by one of the stages
+        """
+        threads = [threading.Thread(target=self._run_fetch),
+                   threading.Thread(target=self._run_decode)]
+        for consumer, q in zip(self._consumers, self._outputs):
+            threads.append(threading.Thread(target=self._run_consumer, args=(consumer, q)))
+
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+
+def fetch_rows(filename, sql, params=()):
+    """
+    Returns a callable which can be used as fetch stage of the pipeline.
+    The database is opened inside the fetch thread, because sqlite
+    connections can only be used by the thread which has created them.
+
+    :param filename: path to the .kismet file
+    :param sql: SQL query
+    :param params: parameters for the query (optional)
+
+    :return: callable which returns an iterator over the result rows
+    """
+    def fetch():
+        db = sqlite3.connect(filename)
+        try:
+            c = db.cursor()
+            for row in c.execute(sql, params):
+                yield row
+        finally:
+            db.close()
+    return fetch
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+
+# Simple query server which keeps one or more kismet logfiles decoded in
+# memory and answers queries for access points, devices and clients with a
+# JSON API. The results of queries are cached (LRU). A capture is reloaded
+# and its cached results are dropped as soon as the file changes.
+#
+# Endpoints (all GET, results as json):
+#   /captures                          loaded captures
+#   /aps?capture=&ssid=&ssid_regex=&mac=&encryption=&channel=&manufacturer=
+#   /devices?capture=&type=&phyname=&mac=&channel=&manufacturer=
+#   /clients?capture=&ssid=&ssid_regex=&ap=
+# The parameters limit and offset can be used to page through the results.
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from urllib.parse import urlsplit, parse_qs
+
+from kismetanalyzer import geo
+from kismetanalyzer.model import AccessPoint, Device
+from kismetanalyzer.oui import get_default_path, open_database
+from kismetanalyzer.util import get_encryption_class
+
+
+def ap_to_dict(ap):
+    return {
+        "mac": ap.mac, "ssid": ap.ssid, "encryption": ap.encryption,
+        "encryption_class": get_encryption_class(ap.encryption), "frequency": ap.frequency,
+        "channel": ap.channel, "manufacturer": ap.manufacturer, "signal": ap.signal,
+        "last_seen": ap.last_time, "clients": ap.client_map, "location": list(geo.get_coordinates(ap)),
+    }
+
+
+def device_to_dict(d):
+    return {
+        "mac": d.mac, "type": d.type, "name": d.name, "commonname": d.commonname, "phyname": d.phyname,
+        "frequency": d.frequency, "channel": d.channel, "manufacturer": d.manufacturer, "signal": d.signal,
+        "last_seen": d.last_time, "location": list(geo.get_coordinates(d)),
+    }
+
+
+class Capture(object):
+    """
+    Decoded content of a kismet logfile with indexes for the most common
+    filters.
+    """
+
+    def __init__(self, filename, strongest=False, ouidb=None, name=None):
+        self.filename = filename
+        self.name = name or os.path.basename(filename)
+        self.stamp = self.get_stamp()
+        self.aps = []
+        self.devices = []
+        # indexes: MAC -> position, SSID / type -> positions
+        self.ap_by_mac = {}
+        self.ap_by_ssid = {}
+        self.device_by_mac = {}
+        self.device_by_type = {}
+        # client MAC -> list of positions of the access points
+        self.clients = {}
+
+        db = sqlite3.connect(filename)
+        try:
+            for type_, device in db.execute("SELECT type, device FROM devices; "):
+                try:
+                    dev = json.loads(device)
+                    d = Device.from_json(dev, strongest)
+                    ap = AccessPoint.from_json(dev, strongest) if type_ == 'Wi-Fi AP' else None
+                except Exception as e:
+                    continue
+
+                if ouidb is not None:
+                    d.manufacturer = ouidb.resolve(d.mac, d.manufacturer)
+                    if ap is not None:
+                        ap.manufacturer = d.manufacturer
+
+                self.device_by_mac[d.mac.upper()] = len(self.devices)
+                self.device_by_type.setdefault(d.type, []).append(len(self.devices))
+                self.devices.append(d)
+
+                if ap is not None:
+                    pos = len(self.aps)
+                    self.ap_by_mac[ap.mac.upper()] = pos
+                    self.ap_by_ssid.setdefault(ap.ssid, []).append(pos)
+                    for c in ap.client_map:
+                        self.clients.setdefault(c.upper(), []).append(pos)
+                    self.aps.append(ap)
+        finally:
+            db.close()
+
+    def get_stamp(self):
+        st = os.stat(self.filename)
+        return st.st_mtime, st.st_size
+
+    def is_modified(self):
+        try:
+            return self.get_stamp() != self.stamp
+        except OSError:
+            return True
+
+    def summary(self):
+        return {"name": self.name, "file": self.filename, "aps": len(self.aps),
+                "devices": len(self.devices), "clients": len(self.clients)}
+
+
+def _get(params, name):
+    values = params.get(name)
+    if values:
+        return values[0]
+    return None
+
+
+def _match_ssid(capture, params):
+    # positions of the access points matching the parameters ssid (exact
+    # match, uses the index) and ssid_regex (like --ssid of the scripts).
+    # None is returned if both filters are not used.
+    ssid = _get(params, "ssid")
+    ssid_regex = _get(params, "ssid_regex")
+    if ssid is None and ssid_regex is None:
+        return None
+    if ssid is not None:
+        positions = capture.ap_by_ssid.get(ssid, [])
+    else:
+        positions = range(len(capture.aps))
+    if ssid_regex is not None:
+        regex = re.compile(ssid_regex)
+        positions = [i for i in positions if regex.match(capture.aps[i].ssid)]
+    return positions
+
+
+def query_aps(capture, params):
+    """
+    Filter the access points of a capture. ssid_regex works like --ssid of
+    kismet_analyzer_aplist, encryption is a substring of the encryption
+    string, all other filters are exact matches.
+    """
+    mac = _get(params, "mac")
+    positions = _match_ssid(capture, params)
+    if mac is not None:
+        pos = capture.ap_by_mac.get(mac.upper())
+        positions = [i for i in [pos] if i is not None and (positions is None or i in positions)]
+    elif positions is None:
+        positions = range(len(capture.aps))
+
+    encryption = _get(params, "encryption")
+    channel = _get(params, "channel")
+    manufacturer = _get(params, "manufacturer")
+    result = []
+    for i in positions:
+        ap = capture.aps[i]
+        if encryption is not None and encryption not in ap.encryption:
+            continue
+        if channel is not None and str(ap.channel) != channel:
+            continue
+        if manufacturer is not None and ap.manufacturer != manufacturer:
+            continue
+        result.append(ap_to_dict(ap))
+    return result
+
+
+def query_devices(capture, params):
+    """
+    Filter the devices of a capture. All filters are exact matches.
+    """
+    mac = _get(params, "mac")
+    type_ = _get(params, "type")
+    if mac is not None:
+        pos = capture.device_by_mac.get(mac.upper())
+        positions = [] if pos is None else [pos]
+    elif type_ is not None:
+        positions = capture.device_by_type.get(type_, [])
+    else:
+        positions = range(len(capture.devices))
+
+    phyname = _get(params, "phyname")
+    channel = _get(params, "channel")
+    manufacturer = _get(params, "manufacturer")
+    result = []
+    for i in positions:
+        d = capture.devices[i]
+        if type_ is not None and d.type != type_:
+            continue
+        if phyname is not None and d.phyname != phyname:
+            continue
+        if channel is not None and str(d.channel) != channel:
+            continue
+        if manufacturer is not None and d.manufacturer != manufacturer:
+            continue
+        result.append(device_to_dict(d))
+    return result
+
+
+def query_clients(capture, params):
+    """
+    List the clients which are connected to access points with the given
+    SSID (ssid or ssid_regex) or the given access point MAC (ap).
+    """
+    aps = _match_ssid(capture, params)
+    if aps is not None:
+        aps = set(aps)
+    ap_mac = _get(params, "ap")
+    if ap_mac is not None:
+        pos = capture.ap_by_mac.get(ap_mac.upper())
+        aps = set(i for i in [pos] if i is not None and (aps is None or i in aps))
+
+    result = []
+    for client, positions in capture.clients.items():
+        if aps is not None:
+            positions = [i for i in positions if i in aps]
+            if not positions:
+                continue
+        result.append({"mac": client, "aps": [capture.aps[i].mac for i in positions],
+                       "ssids": sorted(set(capture.aps[i].ssid for i in positions))})
+    return result
+
+
+QUERIES = {
+    "/aps": query_aps,
+    "/devices": query_devices,
+    "/clients": query_clients,
+}
+
+
+def get_capture_names(filenames):
+    """
+    Returns a unique name for each file. The name is the filename without
+    directory. Files with the same filename (e.g. a/survey.kismet and
+    b/survey.kismet) are named by their relative path.
+
+    :raises ValueError: if a file is given more than once
+    """
+    paths = [os.path.abspath(f) for f in filenames]
+    for path in paths:
+        if paths.count(path) > 1:
+            raise ValueError("{0} is given more than once".format(path))
+    basenames = [os.path.basename(f) for f in filenames]
+    return [os.path.relpath(f) if basenames.count(b) > 1 else b for f, b in zip(filenames, basenames)]
+
+
+class QueryServer(object):
+    """
+    Keeps the captures in memory and answers the queries. Loading and
+    filtering run in a thread pool, so the event loop keeps accepting
+    requests while a large capture is (re)loaded.
+    """
+
+    def __init__(self, filenames, strongest=False, ouidb=None, cache_size=256):
+        self._filenames = filenames
+        self._strongest = strongest
+        self._ouidb = ouidb
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.captures = OrderedDict()
+        for filename, name in zip(filenames, get_capture_names(filenames)):
+            self.load(filename, name)
+
+    def load(self, filename, name=None):
+        capture = Capture(filename, self._strongest, self._ouidb, name)
+        with self._lock:
+            self.captures[capture.name] = capture
+            # drop cached results of the previous version of the capture
+            for key in [k for k in self._cache if k[0] == capture.name]:
+                del self._cache[key]
+        print("Loaded {} access points and {} devices from {}".format(len(capture.aps), len(capture.devices),
+                                                                       filename))
+        return capture
+
+    def get_capture(self, name):
+        """
+        Returns the capture with the given name (or the first capture if no
+        name is given). Modified files are reloaded.
+        """
+        with self._lock:
+            if name is None:
+                capture = next(iter(self.captures.values()), None)
+            else:
+                capture = self.captures.get(name)
+        if capture is not None and capture.is_modified():
+            with self._reload_lock:
+                # another request may have reloaded the capture meanwhile
+                with self._lock:
+                    capture = self.captures[capture.name]
+                if capture.is_modified():
+                    capture = self.load(capture.filename, capture.name)
+        return capture
+
+    def query(self, path, params):
+        """
+        Execute a query and return the status code and the json result.
+        """
+        if path == "/captures":
+            return 200, [c.summary() for c in self.captures.values()]
+        if path not in QUERIES:
+            return 404, {"error": "unknown endpoint {0}".format(path)}
+
+        capture = self.get_capture(_get(params, "capture"))
+        if capture is None:
+            return 404, {"error": "unknown capture"}
+
+        try:
+            limit = int(_get(params, "limit") or 0)
+            offset = int(_get(params, "offset") or 0)
+        except ValueError:
+            return 400, {"error": "limit and offset must be numbers"}
+
+        # the stamp is part of the key, so results of a modified capture
+        # are never returned
+        filters = tuple(sorted((k, tuple(v)) for k, v in params.items() if k not in ("limit", "offset", "capture")))
+        key = (capture.name, capture.stamp, path, filters)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+        if result is None:
+            try:
+                result = QUERIES[path](capture, params)
+            except re.error as e:
+                return 400, {"error": "invalid regex: {0}".format(e)}
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        end = offset + limit if limit else None
+        return 200, {"capture": capture.name, "total": len(result), "results": result[offset:end]}
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            # skip the headers of the request
+            while True:
+                line = await reader.readline()
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+
+            parts = request.decode("latin-1").split()
+            if len(parts) < 2 or parts[0] != "GET":
+                status, result = 405, {"error": "only GET requests are supported"}
+            else:
+                url = urlsplit(parts[1])
+                loop = asyncio.get_event_loop()
+                status, result = await loop.run_in_executor(None, self.query, url.path.rstrip("/") or "/",
+                                                            parse_qs(url.query))
+        except Exception as e:
+            status, result = 500, {"error": str(e)}
+
+        body = json.dumps(result).encode("utf-8")
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   500: "Internal Server Error"}
+        header = "HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\n" \
+                 "Connection: close\r\n\r\n".format(status, reasons[status], len(body))
+        try:
+            writer.write(header.encode("latin-1") + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print("Listening on http://{0}:{1}/".format(host, port))
+        async with server:
+            await server.serve_forever()
+
+
+def gen_server():
+    parser = argparse.ArgumentParser(description="Serve queries over kismet logfiles which are kept in memory.")
+    parser.add_argument("--in", action="store", dest="infiles", nargs="+", required=True, help='Input files (.kismet)')
+    parser.add_argument("--host", action="store", dest="host", default="127.0.0.1", help='Listen address (default: 127.0.0.1)')
+    parser.add_argument("--port", action="store", dest="port", type=int, default=8080, help='Listen port (default: 8080)')
+    parser.add_argument("--cache-size", action="store", dest="cachesize", type=int, default=256,
+                        help='Number of cached query results (default: 256)')
+    parser.add_argument("--strongest-point", action="store_true", dest="strongest", default=False,
+                        help='Use the location of the strongest signal')
+    parser.add_argument("--oui", action="store", dest="oui", nargs="?", const=get_default_path(), default=None,
+                        help="Resolve manufacturers with the offline OUI database (optional path, see kismet_analyzer_oui)")
+    parameters = parser.parse_args()
+
+    ouidb = None
+    if parameters.oui is not None:
+        ouidb = open_database(parameters.oui)
+
+    try:
+        server = QueryServer(parameters.infiles, parameters.strongest, ouidb, parameters.cachesize)
+    except Exception as e:
+        print("Failed to open kismet logfile: {0}".format(e))
+        sys.exit(1)
+
+    try:
+        asyncio.run(server.serve(parameters.host, parameters.port))
+    except KeyboardInterrupt:
+        pass
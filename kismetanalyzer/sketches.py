@@ -0,0 +1,158 @@
+# This script contains probabilistic data structures (sketches) which are
+# used for approximate statistics of very large kismet databases. All
+# sketches use a fixed amount of memory and report error bounds for their
+# estimates.
+#
+# @author Christoph Bless
+#
+import hashlib
+import heapq
+import math
+import random
+import struct
+
+
+# z-score used for the 95% confidence intervals
+Z95 = 1.96
+
+
+def _hash64(value):
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8")
+    return struct.unpack("<Q", hashlib.blake2b(value, digest_size=8).digest())[0]
+
+
+class HyperLogLog(object):
+    """
+    Estimates the number of distinct values with 2^precision registers of
+    one byte. The relative standard error is 1.04 / sqrt(2^precision)
+    (about 0.8% for the default precision of 14).
+    """
+
+    def __init__(self, precision=14):
+        self._p = precision
+        self._m = 1 << precision
+        self._registers = bytearray(self._m)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> self._shift
+        # position of the leftmost 1-bit in the remaining bits
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def estimate(self):
+        m = self._m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            estimate = m * math.log(float(m) / zeros)
+        return estimate
+
+    def error(self):
+        """
+        Returns the 95% error bound of the current estimate.
+        """
+        return Z95 * 1.04 / math.sqrt(self._m) * self.estimate()
+
+
+class CountMinSketch(object):
+    """
+    Estimates the frequency of values with depth rows of width counters.
+    An estimate never undercounts, it overcounts by at most e / width * total
+    with probability 1 - e^-depth. The most frequent values are tracked in
+    a small candidate list, so that the top values can be reported.
+    """
+
+    def __init__(self, width=2048, depth=5, track=50):
+        self._width = width
+        self._depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+        self._track = track
+        self._candidates = {}
+        self.total = 0
+
+    def _indexes(self, value):
+        h = _hash64(value)
+        h1, h2 = h & 0xFFFFFFFF, h >> 32
+        return [(h1 + i * h2) % self._width for i in range(self._depth)]
+
+    def add(self, value, count=1):
+        estimate = None
+        for row, i in zip(self._rows, self._indexes(value)):
+            row[i] += count
+            if estimate is None or row[i] < estimate:
+                estimate = row[i]
+        self.total += count
+
+        if value in self._candidates or len(self._candidates) < self._track:
+            self._candidates[value] = estimate
+        else:
+            smallest = min(self._candidates, key=self._candidates.get)
+            if estimate > self._candidates[smallest]:
+                del self._candidates[smallest]
+                self._candidates[value] = estimate
+
+    def estimate(self, value):
+        return min(row[i] for row, i in zip(self._rows, self._indexes(value)))
+
+    def error(self):
+        """
+        Returns the maximum overcount of an estimate (with probability
+        1 - e^-depth).
+        """
+        return math.e / self._width * self.total
+
+    def top(self, n):
+        """
+        Returns the n most frequent values as list of tuples (value, count).
+        """
+        return heapq.nlargest(n, ((v, self.estimate(v)) for v in self._candidates), key=lambda x: x[1])
+
+
+class Reservoir(object):
+    """
+    Uniform random sample of size items of a stream (algorithm R).
+    """
+
+    def __init__(self, size=10, seed=None):
+        self._size = size
+        self._random = random.Random(seed)
+        self.items = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self._size:
+            self.items.append(item)
+        else:
+            i = self._random.randrange(self.seen)
+            if i < self._size:
+                self.items[i] = item
+
+
+def sample_error(count, sample_size, scale):
+    """
+    Returns the 95% error bound of a count which is extrapolated from a
+    random sample (drawn without replacement). The finite population
+    correction is applied, so the error is 0 if the sample covers the whole
+    population.
+
+    :param count: number of matching items in the sample
+    :param sample_size: size of the sample
+    :param scale: factor used to extrapolate the count (population size /
+                  sample size)
+    """
+    if sample_size == 0:
+        return 0.0
+    population = scale * sample_size
+    if population <= sample_size:
+        return 0.0
+    p = float(count) / sample_size
+    fpc = (population - sample_size) / (population - 1)
+    return Z95 * scale * math.sqrt(p * (1 - p) * sample_size * fpc)
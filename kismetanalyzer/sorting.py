@@ -0,0 +1,160 @@
+# This script contains functions to sort access points and devices. Top-N
+# queries are answered with a heap, full sorts use an external merge sort
+# which spills sorted runs to temporary files, so the number of devices kept
+# in memory is bounded.
+#
+# @author Christoph Bless
+#
+import heapq
+import os
+import pickle
+import re
+import tempfile
+
+
+def _number(value, default):
+    """
+    Convert value into a float. Strings like "6HT40" are converted by using
+    the leading digits. The default is returned for missing values.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        m = re.match(r"\s*(-?\d+(\.\d+)?)", str(value))
+        if m:
+            return float(m.group(1))
+    return default
+
+
+def _name(dev):
+    # access points have a SSID, other devices only a name
+    if hasattr(dev, "ssid"):
+        return dev.ssid
+    return dev.name
+
+
+# Each sort key returns a value where smaller means "comes first". Signal,
+# client count and last_seen are sorted descending (strongest, busiest and
+# most recent devices first), channel and SSID ascending.
+SORT_KEYS = {
+    "signal": lambda d: -_number(d.signal, float("-inf")),
+    "channel": lambda d: _number(d.channel, float("inf")),
+    "ssid": lambda d: (_name(d) or "").lower(),
+    "last_seen": lambda d: -_number(d.last_time, 0),
+    "clients": lambda d: -len(d.client_map),
+}
+
+
+class ExternalSort(object):
+    """
+    Sorts an iterable of devices with bounded memory. The input is read in
+    runs of buffer_size devices. Each run is sorted in memory and written
+    to a temporary file. Iterating over an instance merges the runs with a
+    heap. The result can be iterated multiple times (e.g. once for the csv
+    and once for the kml export).
+
+    If the input fits into a single run no file is written. At most
+    max_fan_in runs are merged at once: if there are more runs, groups of
+    runs are merged into larger runs first (multi-pass merge), so the
+    number of open files stays bounded.
+    """
+
+    def __init__(self, devices, key, buffer_size=100000, max_fan_in=64):
+        self._key = key
+        self._runs = []
+        self._memory = None
+        self._max_fan_in = max(2, max_fan_in)
+
+        try:
+            buf = []
+            for dev in devices:
+                buf.append(dev)
+                if len(buf) >= buffer_size:
+                    buf.sort(key=key)
+                    self._spill(buf)
+                    buf = []
+            if self._runs:
+                if buf:
+                    buf.sort(key=key)
+                    self._spill(buf)
+                while len(self._runs) > self._max_fan_in:
+                    self._merge_pass()
+            else:
+                buf.sort(key=key)
+                self._memory = buf
+        except BaseException:
+            self.close()
+            raise
+
+    def _spill(self, devices):
+        # write sorted devices to a new run
+        fd, path = tempfile.mkstemp(prefix="kismetanalyzer-sort-")
+        self._runs.append(path)
+        with os.fdopen(fd, "wb") as f:
+            for dev in devices:
+                pickle.dump(dev, f, pickle.HIGHEST_PROTOCOL)
+
+    def _merge_pass(self):
+        # merge groups of max_fan_in consecutive runs into one run each
+        # (consecutive runs keep the merge stable)
+        runs, self._runs = self._runs, []
+        try:
+            for i in range(0, len(runs), self._max_fan_in):
+                group = runs[i:i + self._max_fan_in]
+                if len(group) == 1:
+                    self._runs.append(group[0])
+                    continue
+                self._spill(heapq.merge(*[self._read_run(path) for path in group], key=self._key))
+                for path in group:
+                    os.remove(path)
+        except BaseException:
+            self._runs.extend(path for path in runs if os.path.exists(path))
+            raise
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def __iter__(self):
+        if self._memory is not None:
+            return iter(self._memory)
+        # each run is opened again for every iteration, so that the runs
+        # can be merged concurrently by different consumers
+        runs = [self._read_run(path) for path in self._runs]
+        return heapq.merge(*runs, key=self._key)
+
+    def close(self):
+        """
+        Remove the temporary files of the spilled runs.
+        """
+        for path in self._runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._runs = []
+
+
+def sort_devices(devices, sort_by, top=None, buffer_size=100000, max_fan_in=64):
+    """
+    Sort access points or devices.
+
+    :param devices: iterable of kismetanalyzer.model.AccessPoint or
+                    kismetanalyzer.model.Device instances
+    :param sort_by: name of the sort key (see SORT_KEYS)
+    :param top: if set, only the first top devices are returned
+    :param buffer_size: maximum number of devices which are kept in
+                        memory during a full sort
+    :param max_fan_in: maximum number of runs which are merged at once
+
+    :return: sorted list (top-N) or ExternalSort instance (full sort)
+    """
+    key = SORT_KEYS[sort_by]
+    if top is not None:
+        return heapq.nsmallest(top, devices, key=key)
+    return ExternalSort(devices, key, buffer_size, max_fan_in)
@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+
+# Simple script to print summary statistics of a kismet database. The
+# statistics are aggregated by sqlite (GROUP BY on the native columns and on
+# fields extracted with the json1 extension), no model objects are created.
+# Without json1 the json fields are counted in a single pass over the
+# devices table.
+#
+# For a first look at very large databases the switch --approx computes
+# estimates with error bounds from a random sample of rows and sketches.
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+from collections import Counter
+
+from kismetanalyzer.sketches import HyperLogLog, CountMinSketch, Reservoir, sample_error
+
+
+# fields which are extracted from the json string of the device column
+# (name, path). The paths are used for json_extract() of sqlite.
+FIELDS = [
+    ("crypt", ['kismet.device.base.crypt']),
+    ("manuf", ['kismet.device.base.manuf']),
+    ("channel", ['kismet.device.base.channel']),
+    ("frequency", ['kismet.device.base.frequency']),
+    ("name", ['kismet.device.base.name']),
+    ("clients", ['dot11.device', 'dot11.device.associated_client_map']),
+]
+
+
+def has_json1(db):
+    """
+    checks if the sqlite library supports the json1 extension.
+
+    :param db: sqlite connection
+
+    :return: true if json_extract() is available, false otherwise
+    :rtype: boolean
+    """
+    try:
+        db.execute("SELECT json_extract('{\"a\": 1}', '$.a')").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def get_json_path(keys):
+    return "$." + ".".join('"{0}"'.format(k) for k in keys)
+
+
+def _execute(db, sql, rowids=None):
+    # execute a query on the whole table or only on the rows of a sample
+    # (the placeholder {where} is replaced by the rowid filter)
+    if rowids is None:
+        for row in db.execute(sql.format(where="")):
+            yield row
+        return
+    rowids = list(rowids)
+    for i in range(0, len(rowids), 500):
+        batch = rowids[i:i + 500]
+        where = "WHERE rowid IN ({0})".format(",".join("?" * len(batch)))
+        for row in db.execute(sql.format(where=where), batch):
+            yield row
+
+
+def iter_devices(db, rowids=None):
+    """
+    Iterate over the devices table and return the native columns type and
+    phyname together with the fields listed in FIELDS.
+
+    :param db: sqlite connection
+    :param rowids: only read the rows with these rowids (optional)
+
+    :return: iterator over tuples (type, phyname, crypt, manuf, channel,
+             frequency, name, clients). clients is a json string of the
+             associated client map or None.
+    """
+    if has_json1(db):
+        columns = ["json_extract(CAST(device AS TEXT), '{0}')".format(get_json_path(keys)) for _, keys in FIELDS]
+        sql = "SELECT type, phyname, " + ", ".join(columns) + " FROM devices {where}; "
+        for row in _execute(db, sql, rowids):
+            yield row
+        return
+
+    # fallback for sqlite versions without json1 support
+    for row in _execute(db, "SELECT type, phyname, device FROM devices {where}; ", rowids):
+        try:
+            dev = json.loads(row[2])
+        except Exception:
+            continue
+        values = []
+        for _, keys in FIELDS:
+            value = dev
+            for k in keys:
+                value = value.get(k) if isinstance(value, dict) else None
+            values.append(value)
+        if isinstance(values[-1], dict):
+            values[-1] = json.dumps(values[-1])
+        yield tuple([row[0], row[1]] + values)
+
+
+def _count(db, sql, counter=None):
+    # add the rows (value, count) of an aggregation query to a Counter
+    if counter is None:
+        counter = Counter()
+    for value, count in db.execute(sql):
+        counter[value] += count
+    return counter
+
+
+def collect_stats(db):
+    """
+    Compute the summary statistics. The counts are aggregated by sqlite
+    (GROUP BY), only the aggregated rows are returned to Python. The json
+    fields are extracted once into a temporary table. Without the json1
+    extension the json fields are counted in a single pass over the devices
+    table.
+
+    :param db: sqlite connection
+
+    :return: dictionary with one Counter per statistic
+    :rtype: dict
+    """
+    stats = {
+        "devices_by_type": _count(db, "SELECT COALESCE(type, ''), COUNT(*) FROM devices GROUP BY 1; "),
+        "devices_by_phyname": _count(db, "SELECT COALESCE(phyname, ''), COUNT(*) FROM devices GROUP BY 1; "),
+    }
+
+    if has_json1(db):
+        # extract the json fields once into a temporary table, the
+        # statistics are then aggregated from this table
+        columns = ", ".join("json_extract(CAST(device AS TEXT), '{0}') AS {1}".format(get_json_path(keys), name)
+                            for name, keys in FIELDS)
+        db.execute("DROP TABLE IF EXISTS temp.device_fields; ")
+        db.execute("CREATE TEMP TABLE device_fields AS SELECT type, " + columns + " FROM devices; ")
+        queries = [
+            ("aps_by_encryption", "SELECT COALESCE(crypt, ''), COUNT(*) FROM device_fields "
+                                  "WHERE type = 'Wi-Fi AP' GROUP BY 1; "),
+            ("manufacturers", "SELECT COALESCE(NULLIF(manuf, ''), 'Unknown'), COUNT(*) FROM device_fields GROUP BY 1; "),
+            ("channels", "SELECT channel, COUNT(*) FROM device_fields GROUP BY 1; "),
+            ("frequencies", "SELECT frequency, COUNT(*) FROM device_fields GROUP BY 1; "),
+            # distinct client MACs per SSID (a client may be associated to
+            # several access points of the same network), the keys of the
+            # client map are the MAC addresses
+            ("clients_per_ssid", "SELECT COALESCE(f.name, ''), COUNT(DISTINCT c.key) FROM device_fields AS f "
+                                 "LEFT JOIN json_each(f.clients) AS c WHERE f.type = 'Wi-Fi AP' GROUP BY 1; "),
+        ]
+        try:
+            for name, sql in queries:
+                stats[name] = _count(db, sql)
+        finally:
+            db.execute("DROP TABLE IF EXISTS temp.device_fields; ")
+        # empty channels and frequencies are not counted
+        for name in ("channels", "frequencies"):
+            for value in [v for v in stats[name] if not v]:
+                del stats[name][value]
+        return stats
+
+    # fallback for sqlite versions without json1 support
+    for name in ("aps_by_encryption", "manufacturers", "channels", "frequencies", "clients_per_ssid"):
+        stats[name] = Counter()
+    ssid_clients = {}
+
+    for type_, phyname, crypt, manuf, channel, frequency, name, clients in iter_devices(db):
+        stats["manufacturers"][manuf or "Unknown"] += 1
+        if channel:
+            stats["channels"][channel] += 1
+        if frequency:
+            stats["frequencies"][frequency] += 1
+
+        if type_ == "Wi-Fi AP":
+            stats["aps_by_encryption"][crypt or ""] += 1
+            macs = ssid_clients.setdefault(name or "", set())
+            if clients:
+                try:
+                    macs.update(json.loads(clients))
+                except ValueError:
+                    pass
+
+    for ssid, macs in ssid_clients.items():
+        stats["clients_per_ssid"][ssid] = len(macs)
+    return stats
+
+
+def sample_rowids(db, table, sample_size, rnd):
+    """
+    Draw random rowids of a table. Rowids which don't exist (e.g. deleted
+    rows) are simply not found, the remaining rows are still a uniform
+    sample.
+
+    :param db: sqlite connection
+    :param table: name of the table
+    :param sample_size: number of rowids to draw
+    :param rnd: instance of random.Random
+
+    :return: tuple (sorted list of rowids, number of possible rowids)
+    """
+    low, high = db.execute("SELECT MIN(rowid), MAX(rowid) FROM {0}; ".format(table)).fetchone()
+    if low is None:
+        return [], 0
+    span = high - low + 1
+    if sample_size >= span:
+        return list(range(low, high + 1)), span
+    return sorted(rnd.sample(range(low, high + 1), sample_size)), span
+
+
+def _estimate_total(hits, draws, span):
+    # estimated number of rows and its 95% error bound
+    if draws == 0:
+        return 0.0, 0.0
+    scale = float(span) / draws
+    return hits * scale, sample_error(hits, draws, scale)
+
+
+def _estimate_counts(counter, draws, span, limit=None, cms=None):
+    # extrapolate the counts of a sample; the overcount of a count-min
+    # sketch is added to the error bound
+    scale = float(span) / draws if draws else 0.0
+    items = counter.top(limit) if cms else counter.most_common(limit)
+    extra = counter.error() if cms else 0.0
+    return [(value, count * scale, sample_error(count, draws, scale) + extra * scale) for value, count in items]
+
+
+def collect_approx_stats(db, sample_size=10000, top=10, preview=5, seed=None):
+    """
+    Estimate the summary statistics of a database without reading all rows.
+
+    The json fields are only extracted for a random sample of rowids of the
+    devices table, the counts are extrapolated from the sample. Manufacturers
+    and SSIDs are counted with count-min sketches. The packets table is
+    sampled the same way as the devices table.
+
+    Each row of the devices table is one device (MAC address), so the number
+    of distinct MAC addresses is the estimated number of devices. HyperLogLog
+    counts the distinct client MACs associated to the sampled access points
+    and the distinct source MACs of the sampled packets. These values can't
+    be extrapolated to the whole capture (they are only lower bounds), so
+    they are reported separately as "sample_only", their error bound is the
+    error of the sketch.
+
+    :param db: sqlite connection
+    :param sample_size: number of rowids drawn per table
+    :param top: number of manufacturers and SSIDs which are reported
+    :param preview: number of access points shown as preview
+    :param seed: seed of the random number generator (optional)
+
+    :return: dictionary with lists of tuples (value, estimate, error)
+             and the preview rows
+    :rtype: dict
+    """
+    rnd = random.Random(seed)
+    result = {}
+
+    rowids, span = sample_rowids(db, "devices", sample_size, rnd)
+    draws = len(rowids)
+    counters = dict((name, Counter()) for name in ("devices_by_type", "devices_by_phyname", "aps_by_encryption",
+                                                    "channels", "frequencies"))
+    manufacturers = CountMinSketch()
+    ssids = CountMinSketch()
+    reservoir = Reservoir(preview, seed)
+    associated = HyperLogLog()
+    hits = 0
+
+    for type_, phyname, crypt, manuf, channel, frequency, name, clients in iter_devices(db, rowids):
+        hits += 1
+        counters["devices_by_type"][type_ or ""] += 1
+        counters["devices_by_phyname"][phyname or ""] += 1
+        manufacturers.add(manuf or "Unknown")
+        if channel:
+            counters["channels"][channel] += 1
+        if frequency:
+            counters["frequencies"][frequency] += 1
+        if type_ == "Wi-Fi AP":
+            counters["aps_by_encryption"][crypt or ""] += 1
+            ssids.add(name or "")
+            reservoir.add({"name": name, "encryption": crypt, "channel": channel, "manufacturer": manuf})
+            if clients:
+                try:
+                    for mac in json.loads(clients):
+                        associated.add(mac)
+                except ValueError:
+                    pass
+
+    totals = [("devices",) + _estimate_total(hits, draws, span)]
+    for name, counter in counters.items():
+        result[name] = _estimate_counts(counter, draws, span)
+    result["manufacturers"] = _estimate_counts(manufacturers, draws, span, top, cms=True)
+    result["aps_per_ssid"] = _estimate_counts(ssids, draws, span, top, cms=True)
+    result["preview"] = reservoir.items
+
+    sample_only = [("distinct_clients_of_sampled_aps", associated.estimate(), associated.error())]
+
+    # packets (older kismet databases may not contain the table)
+    try:
+        rowids, span = sample_rowids(db, "packets", sample_size, rnd)
+    except sqlite3.Error:
+        rowids, span = [], 0
+    if rowids:
+        frequencies = Counter()
+        sources = CountMinSketch()
+        source_macs = HyperLogLog()
+        hits = 0
+        for frequency, sourcemac in _execute(db, "SELECT frequency, sourcemac FROM packets {where}; ", rowids):
+            hits += 1
+            frequencies[frequency] += 1
+            sources.add(sourcemac)
+            source_macs.add(sourcemac)
+        totals.append(("packets",) + _estimate_total(hits, len(rowids), span))
+        sample_only.append(("distinct_sources_of_sampled_packets", source_macs.estimate(), source_macs.error()))
+        result["packets_by_frequency"] = _estimate_counts(frequencies, len(rowids), span)
+        result["packets_by_source"] = _estimate_counts(sources, len(rowids), span, top, cms=True)
+
+    result["totals"] = totals
+    result["sample_only"] = sample_only
+    return result
+
+
+def print_approx_table(stats):
+    """
+    Print the estimated statistics as table to stdout.
+
+    :param stats: dictionary returned by collect_approx_stats()
+    """
+    sections = [
+        ("Totals", "totals"),
+        ("Devices by type", "devices_by_type"),
+        ("Devices by phyname", "devices_by_phyname"),
+        ("Access points by encryption", "aps_by_encryption"),
+        ("Top manufacturers", "manufacturers"),
+        ("Channels", "channels"),
+        ("Frequencies", "frequencies"),
+        ("Access points per SSID", "aps_per_ssid"),
+        ("Packets by frequency", "packets_by_frequency"),
+        ("Top packet sources", "packets_by_source"),
+        ("Distinct MACs of the sample (not estimates for the whole capture)", "sample_only"),
+    ]
+    print("All values are estimates for the whole capture with 95% error bounds (except the distinct")
+    print("MACs of the sample). Each device has its own MAC address.\n")
+    for title, name in sections:
+        if name not in stats:
+            continue
+        print(title)
+        print("-" * len(title))
+        for value, estimate, error in stats[name]:
+            print("{:50s}{:>12.0f} +/- {:.0f}".format(str(value), estimate, error))
+        print("")
+
+    print("Preview of sampled access points")
+    print("--------------------------------")
+    for row in stats["preview"]:
+        print("{:40s}{:30s}{:>6s}".format(str(row["name"]), str(row["encryption"]), str(row["channel"])))
+    print("")
+
+
+def print_table(stats, top=10):
+    """
+    Print the statistics as table to stdout.
+
+    :param stats: dictionary returned by collect_stats()
+    :param top: number of entries shown for the manufacturer and SSID lists
+    """
+    sections = [
+        ("Devices by type", "devices_by_type", None),
+        ("Devices by phyname", "devices_by_phyname", None),
+        ("Access points by encryption", "aps_by_encryption", None),
+        ("Top manufacturers", "manufacturers", top),
+        ("Channels", "channels", None),
+        ("Frequencies", "frequencies", None),
+        ("Clients per SSID", "clients_per_ssid", top),
+    ]
+    for title, name, limit in sections:
+        print(title)
+        print("-" * len(title))
+        for value, count in stats[name].most_common(limit):
+            print("{:50s}{:>10d}".format(str(value), count))
+        print("")
+
+
+def gen_stats():
+    parser = argparse.ArgumentParser(description="Print summary statistics of a kismet logfile.")
+    parser.add_argument("--in", action="store", dest="infile", required=True, help='Input file (.kismet)')
+    parser.add_argument("--top", action="store", dest="top", type=int, default=10,
+                        help='Number of manufacturers and SSIDs to show (default: 10)')
+    parser.add_argument("--json", action="store_true", dest="json", default=False,
+                        help="Print the statistics as json instead of a table")
+    parser.add_argument("--approx", action="store_true", dest="approx", default=False,
+                        help="Estimate the statistics from a random sample (for very large logfiles)")
+    parser.add_argument("--sample-size", action="store", dest="samplesize", type=int, default=10000,
+                        help='Number of sampled rows per table for --approx (default: 10000)')
+    parameters = parser.parse_args()
+
+    try:
+        db = sqlite3.connect(parameters.infile)
+    except Exception as e:
+        print("Failed to open kismet logfile: {0}".format(e))
+        sys.exit(1)
+
+    if parameters.approx:
+        try:
+            stats = collect_approx_stats(db, parameters.samplesize, parameters.top)
+        except Exception:
+            print("Failed to extract data from database")
+            sys.exit()
+
+        if parameters.json:
+            result = {"preview": stats.pop("preview")}
+            for name, values in stats.items():
+                result[name] = [{"value": v, "estimate": round(e), "error": round(err)} for v, e, err in values]
+            print(json.dumps(result, indent=2))
+        else:
+            print_approx_table(stats)
+        return
+
+    try:
+        stats = collect_stats(db)
+    except Exception:
+        print("Failed to extract data from database")
+        sys.exit()
+
+    if parameters.json:
+        result = {}
+        for name, counter in stats.items():
+            limit = parameters.top if name in ("manufacturers", "clients_per_ssid") else None
+            result[name] = [{"value": value, "count": count} for value, count in counter.most_common(limit)]
+        print(json.dumps(result, indent=2))
+    else:
+        print_table(stats, parameters.top)
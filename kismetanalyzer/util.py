@@ -164,6 +164,26 @@ def parse_manufacturer(dev):
     return ""
 
 
+def parse_signal(dev):
+    """
+    This function is used to extract the strongest signal from the json
+    string, which is written to the device column of the kismet database.
+    If the strongest signal is not available the last signal is used.
+
+    :param dev: json string from the kismet database column "device"
+
+    :return: Signal in dBm or an empty string if it is not available
+    :rtype: int
+    """
+    if 'kismet.device.base.signal' in dev:
+        signal = dev['kismet.device.base.signal']
+        if 'kismet.common.signal.max_signal' in signal:
+            return signal['kismet.common.signal.max_signal']
+        if 'kismet.common.signal.last_signal' in signal:
+            return signal['kismet.common.signal.last_signal']
+    return ""
+
+
 def parse_name(dev):
     """
     This function is used to parse the name from the json string,
@@ -224,6 +244,123 @@ def parse_type(dev):
     return ""
 
 
+def parse_probed_ssids(dev):
+    """
+    This function is used to extract the SSIDs probed by a client from the
+    json string, which is written to the device column of the kismet database.
+
+    :param dev: json string from the kismet database column "device"
+
+    :return: list of probed SSIDs (empty SSIDs of broadcast probes are skipped)
+    :rtype: list
+    """
+    ssids = []
+    if 'dot11.device' in dev:
+        if 'dot11.device.probed_ssid_map' in dev['dot11.device']:
+            probes = dev['dot11.device']['dot11.device.probed_ssid_map']
+            # older kismet versions store the probes as dictionary
+            if isinstance(probes, dict):
+                probes = probes.values()
+            for p in probes:
+                ssid = p.get('dot11.probedssid.ssid', "")
+                if ssid:
+                    ssids.append(ssid)
+    return ssids
+
+
+def parse_first_time(dev):
+    """
+    This function is used to extract the timestamp of the first observation
+    from the json string, which is written to the device column of the
+    kismet database.
+
+    :param dev: json string from the kismet database column "device"
+
+    :return: Unix timestamp or 0 if it is not available
+    :rtype: int
+    """
+    if 'kismet.device.base.first_time' in dev:
+        return dev['kismet.device.base.first_time']
+    return 0
+
+
+def parse_last_time(dev):
+    """
+    This function is used to extract the timestamp of the last observation
+    from the json string, which is written to the device column of the
+    kismet database.
+
+    :param dev: json string from the kismet database column "device"
+
+    :return: Unix timestamp or 0 if it is not available
+    :rtype: int
+    """
+    if 'kismet.device.base.last_time' in dev:
+        return dev['kismet.device.base.last_time']
+    return 0
+
+
+def is_locally_administered(mac):
+    """
+    checks if the given MAC-Address is locally administered. Randomized
+    client MACs have this bit set.
+
+    :param mac: MAC-Address as string (e.g. "DA:A1:19:00:11:22")
+
+    :return: true if the locally administered bit is set, false otherwise
+    :rtype: boolean
+    """
+    try:
+        return bool(int(mac[0:2], 16) & 0x02)
+    except ValueError:
+        return False
+
+
+def frequency_to_channel(frequency):
+    """
+    Convert a frequency as stored by kismet (kHz) into a Wi-Fi channel
+    number. Frequencies outside the 2.4, 5 and 6 GHz bands are returned
+    as empty string.
+
+    :param frequency: frequency in kHz
+
+    :return: channel number as string
+    :rtype: string
+    """
+    try:
+        mhz = int(round(float(frequency) / 1000))
+    except (TypeError, ValueError):
+        return ""
+    if mhz == 2484:
+        return "14"
+    if 2412 <= mhz < 2484:
+        return str((mhz - 2407) // 5)
+    if 5950 < mhz <= 7125:
+        return str((mhz - 5950) // 5)
+    if 5000 <= mhz <= 5950:
+        return str((mhz - 5000) // 5)
+    return ""
+
+
+def get_encryption_class(encryption):
+    """
+    Returns the class of an encryption string (the same classes are used
+    for the colors of the KML exports).
+
+    :param encryption: encryption string
+
+    :return: "WPA", "WEP", "Open" or "Unknown"
+    :rtype: string
+    """
+    if 'WPA' in encryption:
+        return "WPA"
+    elif 'WEP' in encryption:
+        return "WEP"
+    elif 'Open' in encryption:
+        return "Open"
+    return "Unknown"
+
+
 def does_ssid_matches(dev, ssid):
     """
     checks if the device SSID matches the given SSID string.
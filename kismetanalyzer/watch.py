@@ -0,0 +1,543 @@
+#!/usr/bin/env python
+
+# Simple daemon which watches a directory for new kismet logfiles (e.g.
+# rotated logfiles uploaded by sensors) and processes each file with the
+# aplist, devices and clientlist scripts. A file is processed as soon as it
+# is complete: its size and modification time did not change for a given
+# time and kismet's journal file is gone.
+#
+# The directory is watched with inotify (Linux). If inotify is not
+# available the directory is polled. The files are processed by a bounded
+# pool of workers, each script runs in its own process. Processed files are
+# recorded in a ledger (sqlite), so files are never processed twice, also
+# after a restart. Files which failed are retried with a backoff. The queue
+# depth and the latency of the processed files can be queried in the
+# Prometheus text format (--metrics-port).
+#
+# @author Christoph Bless
+#
+from __future__ import print_function
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+
+# kismet writes a journal (or write-ahead log) while the logfile is open
+JOURNAL_SUFFIXES = ("-journal", "-wal")
+
+# scripts (module, function) of the pipelines
+PIPELINES = {
+    "aplist": ("kismetanalyzer.aplist", "gen_aplist"),
+    "devices": ("kismetanalyzer.devices", "gen_devlist"),
+    "clientlist": ("kismetanalyzer.clientlist", "gen_clientlist"),
+}
+
+# inotify constants (see <sys/inotify.h>)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class InotifyWatcher(object):
+    """
+    Waits for changes in a directory with inotify. The events are only used
+    as trigger for a new scan of the directory.
+    """
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not supported")
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        """
+        Wait until the directory changes or the timeout (seconds) expires.
+
+        :return: True if the directory changed
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher(object):
+    """
+    Fallback if inotify is not available: the directory is scanned after
+    each timeout.
+    """
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return True
+
+    def close(self):
+        pass
+
+
+def get_watcher(directory, polling=False):
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher()
+
+
+def scan(directory, extension=".kismet"):
+    """
+    Returns the logfiles of a directory as dictionary path -> (size, mtime).
+    Logfiles with an open journal are skipped.
+    """
+    files = {}
+    names = set(os.listdir(directory))
+    for name in names:
+        if not name.endswith(extension):
+            continue
+        if any(name + suffix in names for suffix in JOURNAL_SUFFIXES):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if st.st_size > 0 and os.path.isfile(path):
+            files[path] = (st.st_size, st.st_mtime)
+    return files
+
+
+def check_logfile(path):
+    """
+    Check that a file is a readable kismet logfile.
+
+    :raises Exception: if the file is no sqlite database or the table
+                       devices is missing
+    """
+    db = sqlite3.connect("file:{0}?mode=ro".format(quote(path)), uri=True)
+    try:
+        db.execute("SELECT 1 FROM devices LIMIT 1").fetchall()
+    finally:
+        db.close()
+
+
+class Ledger(object):
+    """
+    Records the processed files in a sqlite database. A file is identified
+    by its path, size and modification time, so a file which is replaced is
+    processed again. Files which failed are retried with an exponential
+    backoff until the maximum number of attempts is reached.
+    """
+
+    def __init__(self, filename, max_attempts=3, retry_delay=60.0):
+        self._lock = threading.Lock()
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+                         "status TEXT, detected REAL, started REAL, finished REAL, error TEXT, "
+                         "attempts INTEGER DEFAULT 1)")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(files)")]
+        if "attempts" not in columns:
+            self._db.execute("ALTER TABLE files ADD COLUMN attempts INTEGER DEFAULT 1")
+        self._db.commit()
+
+    def _get(self, path, size, mtime):
+        # status, finish time and number of attempts of the file (None if
+        # this version of the file was not processed yet)
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime, status, finished, attempts FROM files WHERE path = ?",
+                                   (path,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        return row[2], row[3], row[4] or 1
+
+    def is_processed(self, path, size, mtime, now=None):
+        """
+        Returns True if the file must not be processed (now): it was
+        processed successfully, it failed too often or the delay before the
+        next attempt did not expire yet.
+        """
+        entry = self._get(path, size, mtime)
+        if entry is None:
+            return False
+        status, finished, attempts = entry
+        if status == "done" or attempts >= self._max_attempts:
+            return True
+        if now is None:
+            now = time.time()
+        return now < (finished or 0) + self._retry_delay * 2 ** (attempts - 1)
+
+    def record(self, path, size, mtime, status, detected, started, finished, error=None):
+        """
+        Record the result of an attempt.
+
+        :return: number of attempts of this version of the file
+        """
+        entry = self._get(path, size, mtime)
+        attempts = entry[2] + 1 if entry is not None and entry[0] != "done" else 1
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (path, size, mtime, status, detected, started, finished, error, attempts))
+            self._db.commit()
+        return attempts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Metrics(object):
+    """
+    Counters and gauges of the daemon. The latencies (time from the
+    detection of a file until its outputs are written) of the last files
+    are kept for the quantiles.
+    """
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.queued = 0
+        self.running = 0
+        self.files = {"done": 0, "failed": 0}
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.last_latency = 0.0
+        self._latencies = deque(maxlen=window)
+
+    def update(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def set_pending(self, value):
+        with self._lock:
+            self.pending = value
+
+    def finished(self, status, latency):
+        with self._lock:
+            self.files[status] += 1
+            self.latency_sum += latency
+            self.latency_count += 1
+            self.last_latency = latency
+            self._latencies.append(latency)
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            lines = [
+                "# HELP kismet_analyzer_watch_pending Files which are not complete yet",
+                "# TYPE kismet_analyzer_watch_pending gauge",
+                "kismet_analyzer_watch_pending {0}".format(self.pending),
+                "# HELP kismet_analyzer_watch_queue_depth Complete files waiting for a worker",
+                "# TYPE kismet_analyzer_watch_queue_depth gauge",
+                "kismet_analyzer_watch_queue_depth {0}".format(self.queued),
+                "# HELP kismet_analyzer_watch_running Files which are processed",
+                "# TYPE kismet_analyzer_watch_running gauge",
+                "kismet_analyzer_watch_running {0}".format(self.running),
+                "# HELP kismet_analyzer_watch_files_total Processed files",
+                "# TYPE kismet_analyzer_watch_files_total counter",
+            ]
+            for status, count in sorted(self.files.items()):
+                lines.append('kismet_analyzer_watch_files_total{{status="{0}"}} {1}'.format(status, count))
+            lines.extend([
+                "# HELP kismet_analyzer_watch_latency_seconds Time from the detection of a file until it is processed",
+                "# TYPE kismet_analyzer_watch_latency_seconds summary",
+            ])
+            for q in (0.5, 0.9, 0.99):
+                if latencies:
+                    value = latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+                    lines.append('kismet_analyzer_watch_latency_seconds{{quantile="{0}"}} {1:.3f}'.format(q, value))
+            lines.extend([
+                "kismet_analyzer_watch_latency_seconds_sum {0:.3f}".format(self.latency_sum),
+                "kismet_analyzer_watch_latency_seconds_count {0}".format(self.latency_count),
+                "# HELP kismet_analyzer_watch_last_latency_seconds Latency of the last processed file",
+                "# TYPE kismet_analyzer_watch_last_latency_seconds gauge",
+                "kismet_analyzer_watch_last_latency_seconds {0:.3f}".format(self.last_latency),
+            ])
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(metrics, host, port):
+    """
+    Serve the metrics on http://host:port/metrics in a background thread.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def get_commands(infile, prefix, pipelines, formats, ssid):
+    """
+    Returns the commands of the pipelines for a logfile as list of tuples
+    (name, command, stdout file or None).
+    """
+    commands = []
+    for name in pipelines:
+        module, function = PIPELINES[name]
+        cmd = [sys.executable, "-c", "from {0} import {1}; {1}()".format(module, function), "--in", infile]
+        if name == "clientlist":
+            commands.append((name, cmd + ["--ssid", ssid], "{0}-clientlist.txt".format(prefix)))
+        else:
+            cmd += ["--out", prefix] + ["--" + f for f in formats]
+            commands.append((name, cmd, None))
+    return commands
+
+
+class WatchDaemon(object):
+
+    def __init__(self, directory, outdir, ledger, metrics, pipelines, formats, ssid=".*", workers=2,
+                 settle=30.0, interval=5.0, polling=False):
+        self._directory = os.path.abspath(directory)
+        self._outdir = outdir
+        self._ledger = ledger
+        self._metrics = metrics
+        self._pipelines = pipelines
+        self._formats = formats
+        self._ssid = ssid
+        self._workers = workers
+        self._settle = settle
+        self._interval = interval
+        self._polling = polling
+        # files which are not complete yet: path -> (size, mtime, stable since, detected)
+        self._pending = {}
+        # files which are queued or processed
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def process(self, path, size, mtime, detected):
+        """
+        Run the pipelines for one logfile and record the result in the
+        ledger.
+        """
+        self._metrics.update(queued=-1, running=1)
+        started = time.time()
+        try:
+            name = os.path.basename(path)
+            if name.endswith(".kismet"):
+                name = name[:-7]
+            prefix = os.path.join(self._outdir, name)
+
+            errors = []
+            try:
+                check_logfile(path)
+            except Exception as e:
+                errors.append("not a kismet logfile: {0}".format(e))
+
+            commands = [] if errors else get_commands(path, prefix, self._pipelines, self._formats, self._ssid)
+            for pipeline, cmd, stdout in commands:
+                try:
+                    if stdout is None:
+                        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                    else:
+                        with open(stdout, "wb") as f:
+                            result = subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE)
+                    if result.returncode != 0:
+                        output = (result.stdout if stdout is None else result.stderr) or b""
+                        lines = output.decode("utf-8", "replace").strip().splitlines()
+                        errors.append("{0}: {1}".format(pipeline, lines[-1] if lines else result.returncode))
+                except Exception as e:
+                    errors.append("{0}: {1}".format(pipeline, e))
+
+            finished = time.time()
+            status = "failed" if errors else "done"
+            attempts = self._ledger.record(path, size, mtime, status, detected, started, finished,
+                                           "; ".join(errors) or None)
+            if errors:
+                errors.append("attempt {0}".format(attempts))
+            self._metrics.finished(status, finished - detected)
+            print("{0:7s}{1} ({2:.1f}s, latency {3:.1f}s){4}".format(
+                status, path, finished - started, finished - detected, "".join("\n       " + e for e in errors)))
+            sys.stdout.flush()
+        finally:
+            self._metrics.update(running=-1)
+            with self._lock:
+                self._active.discard(path)
+
+    def check(self, executor):
+        """
+        Scan the directory and submit the complete files to the workers.
+        """
+        now = time.time()
+        files = scan(self._directory)
+        for path in list(self._pending):
+            if path not in files:
+                del self._pending[path]
+
+        for path, (size, mtime) in files.items():
+            with self._lock:
+                if path in self._active:
+                    continue
+            if self._ledger.is_processed(path, size, mtime, now):
+                self._pending.pop(path, None)
+                continue
+
+            previous = self._pending.get(path)
+            if previous is None or previous[:2] != (size, mtime):
+                detected = previous[3] if previous is not None else now
+                self._pending[path] = (size, mtime, now, detected)
+                continue
+            if now - previous[2] < self._settle:
+                continue
+
+            # the file did not change for the settle time
+            del self._pending[path]
+            with self._lock:
+                self._active.add(path)
+            self._metrics.update(queued=1)
+            executor.submit(self.process, path, size, mtime, previous[3])
+
+        self._metrics.set_pending(len(self._pending))
+
+    def idle(self):
+        with self._lock:
+            return not self._pending and not self._active
+
+    def run(self, once=False):
+        """
+        Watch the directory until the process is interrupted. If once is
+        True, the function returns as soon as all files which are currently
+        in the directory are processed.
+        """
+        watcher = get_watcher(self._directory, self._polling)
+        print("Watching {0} ({1})".format(self._directory,
+                                          "inotify" if isinstance(watcher, InotifyWatcher) else "polling"))
+        sys.stdout.flush()
+        executor = ThreadPoolExecutor(max_workers=self._workers)
+        try:
+            self.check(executor)
+            while not (once and self.idle()):
+                # check at least every interval, the settle time is
+                # measured between the checks
+                watcher.wait(min(self._interval, self._settle) if self._pending else self._interval)
+                self.check(executor)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            watcher.close()
+
+
+def gen_watch():
+    parser = argparse.ArgumentParser(description="Watch a directory and process new kismet logfiles.")
+    parser.add_argument("--dir", action="store", dest="directory", required=True, help='Directory to watch')
+    parser.add_argument("--out", action="store", dest="outdir", help='Output directory (default: watched directory)')
+    parser.add_argument("--ledger", action="store", dest="ledger",
+                        help='Ledger of the processed files (default: <out>/kismet-analyzer-ledger.sqlite)')
+    parser.add_argument("--pipelines", action="store", dest="pipelines", default="aplist,devices",
+                        help='Comma separated list of pipelines ({0}, default: aplist,devices)'
+                        .format(", ".join(sorted(PIPELINES))))
+    parser.add_argument("--formats", action="store", dest="formats", default="csv,kml",
+                        help='Comma separated list of export formats of aplist and devices '
+                             '(csv, kml, geojson, fgb, default: csv,kml)')
+    parser.add_argument("--ssid", action="store", dest="ssid", default=".*",
+                        help='SSID (or SSID regex) for the clientlist pipeline (default: all)')
+    parser.add_argument("--workers", action="store", dest="workers", type=int, default=2,
+                        help='Number of files processed in parallel (default: 2)')
+    parser.add_argument("--settle", action="store", dest="settle", type=float, default=30.0,
+                        help='Seconds a file must be unchanged before it is processed (default: 30)')
+    parser.add_argument("--interval", action="store", dest="interval", type=float, default=5.0,
+                        help='Seconds between two scans of the directory (default: 5)')
+    parser.add_argument("--max-attempts", action="store", dest="maxattempts", type=int, default=3,
+                        help='Maximum number of attempts for a file which fails (default: 3)')
+    parser.add_argument("--retry-delay", action="store", dest="retrydelay", type=float, default=60.0,
+                        help='Seconds before a failed file is retried, doubled after each attempt (default: 60)')
+    parser.add_argument("--polling", action="store_true", dest="polling", default=False,
+                        help='Poll the directory instead of using inotify')
+    parser.add_argument("--metrics-host", action="store", dest="metricshost", default="127.0.0.1",
+                        help='Listen address of the metrics endpoint (default: 127.0.0.1)')
+    parser.add_argument("--metrics-port", action="store", dest="metricsport", type=int, default=None,
+                        help='Serve metrics (queue depth, latency) on http://<host>:<port>/metrics')
+    parser.add_argument("--once", action="store_true", dest="once", default=False,
+                        help='Exit when all files of the directory are processed')
+    parameters = parser.parse_args()
+
+    pipelines = [p.strip() for p in parameters.pipelines.split(",") if p.strip()]
+    for p in pipelines:
+        if p not in PIPELINES:
+            parser.error("unknown pipeline: {0}".format(p))
+    formats = [f.strip() for f in parameters.formats.split(",") if f.strip()]
+    for f in formats:
+        if f not in ("csv", "kml", "geojson", "fgb"):
+            parser.error("unknown format: {0}".format(f))
+    if parameters.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if not os.path.isdir(parameters.directory):
+        print("Directory not found: {0}".format(parameters.directory))
+        sys.exit(1)
+    if parameters.outdir is None:
+        parameters.outdir = parameters.directory
+    if parameters.ledger is None:
+        parameters.ledger = os.path.join(parameters.outdir, "kismet-analyzer-ledger.sqlite")
+
+    try:
+        os.makedirs(parameters.outdir, exist_ok=True)
+        ledger = Ledger(parameters.ledger, parameters.maxattempts, parameters.retrydelay)
+    except Exception as e:
+        print("Failed to open ledger: {0}".format(e))
+        sys.exit(1)
+
+    metrics = Metrics()
+    server = None
+    if parameters.metricsport is not None:
+        server = serve_metrics(metrics, parameters.metricshost, parameters.metricsport)
+
+    daemon = WatchDaemon(parameters.directory, parameters.outdir, ledger, metrics, pipelines, formats,
+                         parameters.ssid, parameters.workers, parameters.settle, parameters.interval,
+                         parameters.polling)
+    try:
+        daemon.run(parameters.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.shutdown()
+        ledger.close()
@@ -23,13 +23,21 @@ setup(
     install_requires=[
         'fastkml',
         'pygeoif',
-        'lxml'
+        'lxml',
+        'numpy'
     ],
     entry_points = {
         "console_scripts": [
             "kismet_analyzer_aplist = kismetanalyzer.aplist:gen_aplist",
             "kismet_analyzer_clientlist = kismetanalyzer.clientlist:gen_clientlist",
             "kismet_analyzer_devices = kismetanalyzer.devices:gen_devlist",
+            "kismet_analyzer_clientclusters = kismetanalyzer.clientclusters:gen_clientclusters",
+            "kismet_analyzer_stats = kismetanalyzer.stats:gen_stats",
+            "kismet_analyzer_oui = kismetanalyzer.oui:gen_ouidb",
+            "kismet_analyzer_diff = kismetanalyzer.diff:gen_diff",
+            "kismet_analyzer_server = kismetanalyzer.server:gen_server",
+            "kismet_analyzer_channels = kismetanalyzer.channels:gen_channels",
+            "kismet_analyzer_watch = kismetanalyzer.watch:gen_watch",
         ]
     }
 )
@@ -0,0 +1,71 @@
+import json
+import random
+import sqlite3
+
+import pytest
+
+
+DEVICE_COLUMNS = ("first_time INT, last_time INT, devkey TEXT, phyname TEXT, devmac TEXT, strongest_signal INT, "
+                  "min_lat REAL, min_lon REAL, max_lat REAL, max_lon REAL, avg_lat REAL, avg_lon REAL, "
+                  "bytes_data INT, type TEXT, device BLOB")
+PACKET_COLUMNS = ("ts_sec INT, ts_usec INT, phyname TEXT, sourcemac TEXT, destmac TEXT, transmac TEXT, "
+                  "frequency REAL, devkey TEXT, lat REAL, lon REAL, alt REAL, speed REAL, heading REAL, "
+                  "packet_len INT, signal INT, datasource TEXT, dlt INT, packet BLOB, error INT, tags TEXT")
+
+
+def _mac(rnd):
+    return ":".join("{0:02X}".format(rnd.randint(0, 255) & (0xFC if i == 0 else 0xFF)) for i in range(6))
+
+
+def create_kismet(path, num_aps=300, seed=1):
+    """
+    Create a kismet-like database with num_aps access points, two clients
+    per access point and 20 packets per access point.
+    """
+    rnd = random.Random(seed)
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE devices ({0})".format(DEVICE_COLUMNS))
+    db.execute("CREATE TABLE packets ({0})".format(PACKET_COLUMNS))
+
+    aps = []
+    for i in range(num_aps):
+        mac = _mac(rnd)
+        aps.append(mac)
+        channel = rnd.choice([1, 6, 11, 36, 40])
+        clients = dict((_mac(rnd), {}) for _ in range(rnd.randint(0, 3)))
+        dev = {
+            "kismet.device.base.macaddr": mac,
+            "kismet.device.base.name": rnd.choice(["corp", "guest", "mesh", "cafe", "home{0}".format(i)]),
+            "kismet.device.base.type": "Wi-Fi AP",
+            "kismet.device.base.crypt": rnd.choice(["WPA2 WPA2-PSK AES-CCMP", "Open", "WEP", "WPA3 SAE"]),
+            "kismet.device.base.channel": str(channel),
+            "kismet.device.base.frequency": 2407000 + channel * 5000 if channel < 14 else 5000000 + channel * 5000,
+            "kismet.device.base.manuf": rnd.choice(["Cisco", "Ubiquiti", "AVM", "Unknown"]),
+            "dot11.device": {"dot11.device.associated_client_map": clients},
+        }
+        db.execute("INSERT INTO devices (devmac, phyname, type, device) VALUES (?, ?, ?, ?)",
+                   (mac, "IEEE802.11", "Wi-Fi AP", json.dumps(dev)))
+    for i in range(num_aps * 2):
+        mac = _mac(rnd)
+        dev = {
+            "kismet.device.base.macaddr": mac,
+            "kismet.device.base.type": "Wi-Fi Client",
+            "kismet.device.base.channel": "6",
+            "kismet.device.base.frequency": 2437000,
+            "kismet.device.base.manuf": rnd.choice(["Apple", "Samsung", "Unknown"]),
+        }
+        db.execute("INSERT INTO devices (devmac, phyname, type, device) VALUES (?, ?, ?, ?)",
+                   (mac, "IEEE802.11", "Wi-Fi Client", json.dumps(dev)))
+    for i in range(num_aps * 20):
+        db.execute("INSERT INTO packets (ts_sec, sourcemac, frequency, packet_len, signal) VALUES (?, ?, ?, ?, ?)",
+                   (1600000000 + i, rnd.choice(aps), rnd.choice([2412000, 2437000, 2462000, 5180000]),
+                    rnd.randint(40, 1500), -rnd.randint(30, 90)))
+    db.commit()
+    return db
+
+
+@pytest.fixture
+def kismet_db(tmp_path):
+    db = create_kismet(str(tmp_path / "test.kismet"))
+    yield db
+    db.close()
@@ -0,0 +1,53 @@
+
+import numpy as np
+import pytest
+
+from kismetanalyzer.channels import ChannelHistogram, read_packets
+
+
+def brute_force(db, bucket_size):
+    cells = {}
+    for ts, freq, length, signal in db.execute("SELECT ts_sec, frequency, packet_len, signal FROM packets"):
+        if ts is None:
+            continue
+        cell = cells.setdefault((ts // bucket_size * bucket_size, int(freq or 0)), [0, 0, []])
+        cell[0] += 1
+        cell[1] += length or 0
+        if signal:
+            cell[2].append(signal)
+    return cells
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, 100000])
+@pytest.mark.parametrize("bucket_size", [1, 60, 3600])
+def test_histogram_matches_brute_force(kismet_db, chunk_size, bucket_size):
+    # packets without timestamp, frequency, length or signal
+    kismet_db.execute("INSERT INTO packets (ts_sec, frequency, packet_len, signal) VALUES (NULL, 2412000, 100, -50)")
+    kismet_db.execute("INSERT INTO packets (ts_sec, frequency, packet_len, signal) VALUES (1600000005, NULL, NULL, NULL)")
+    kismet_db.execute("INSERT INTO packets (ts_sec, frequency, packet_len, signal) VALUES (1600000005, 2412000, 60, 0)")
+
+    histogram = ChannelHistogram(bucket_size)
+    num_packets = read_packets(kismet_db, histogram, chunk_size)
+    expected = brute_force(kismet_db, bucket_size)
+
+    assert num_packets == sum(cell[0] for cell in expected.values())
+    records = histogram.records()
+    assert [(r["bucket"], r["frequency"]) for r in records] == sorted(expected)
+    for r in records:
+        packets, size, signals = expected[(r["bucket"], r["frequency"])]
+        assert r["packets"] == packets
+        assert r["bytes"] == size
+        if signals:
+            assert r["avg_signal"] == round(float(np.mean(signals)), 1)
+            assert r["min_signal"] == min(signals)
+            assert r["max_signal"] == max(signals)
+        else:
+            assert r["avg_signal"] is None
+            assert r["min_signal"] is None
+            assert r["max_signal"] is None
+
+
+def test_invalid_bucket_size():
+    for bucket_size in (0, -60):
+        with pytest.raises(ValueError):
+            ChannelHistogram(bucket_size)
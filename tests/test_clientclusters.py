@@ -0,0 +1,58 @@
+from kismetanalyzer.clientclusters import build_index, cluster_clients, get_fingerprints
+from kismetanalyzer.model import Client
+
+
+def make_client(num, probed_ssids, first_time, manufacturer="Unknown"):
+    mac = "DA:A1:19:{0:02X}:{1:02X}:{2:02X}".format(num >> 16 & 0xFF, num >> 8 & 0xFF, num & 0xFF)
+    return Client(mac=mac, manufacturer=manufacturer, probed_ssids=list(probed_ssids),
+                  first_time=first_time, last_time=first_time + 5)
+
+
+def test_rotated_macs_of_one_device_are_clustered():
+    # one device which rotated its MAC address 50 times
+    clients = [make_client(i, ["HomeNet", "CafeN"], 1000 + i) for i in range(50)]
+
+    fingerprints = get_fingerprints(clients, build_index(clients))
+    assert all(fp == frozenset(["HomeNet", "CafeN"]) for fp in fingerprints)
+
+    clusters = cluster_clients(clients)
+    assert len(clusters) == 1
+    assert len(clusters[0]) == 50
+
+
+def test_slowly_rotated_macs_of_one_device_are_clustered():
+    # one device which rotated its MAC address every 10 minutes, so the
+    # first and the last MAC are seen hours apart (more than max_gap)
+    clients = [make_client(i, ["HomeNet", "CafeN"], 1000 + 600 * i) for i in range(50)]
+
+    clusters = cluster_clients(clients, max_gap=3600)
+    assert len(clusters) == 1
+    assert len(clusters[0]) == 50
+
+    # the order of the clients in the logfile doesn't matter
+    clusters = cluster_clients(list(reversed(clients)), max_gap=3600)
+    assert len(clusters) == 1
+
+
+def test_common_ssids_are_ignored():
+    # 20 devices which rotated their MAC 3 times, all of them probe for
+    # eduroam and for their own home network
+    clients = []
+    for device in range(20):
+        for rotation in range(3):
+            clients.append(make_client(device * 3 + rotation, ["eduroam", "home{0}".format(device)],
+                                       1000 + device * 10 + rotation))
+
+    fingerprints = get_fingerprints(clients, build_index(clients))
+    assert all("eduroam" not in fp for fp in fingerprints)
+
+    clusters = cluster_clients(clients)
+    assert len(clusters) == 20
+    for cluster in clusters:
+        assert len(cluster) == 3
+        assert len(set(tuple(sorted(c.probed_ssids)) for c in cluster)) == 1
+
+
+def test_clients_are_not_merged_across_large_gaps():
+    clients = [make_client(0, ["HomeNet"], 1000), make_client(1, ["HomeNet"], 1000 + 7200)]
+    assert len(cluster_clients(clients, max_gap=3600)) == 2
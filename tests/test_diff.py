@@ -0,0 +1,88 @@
+import json
+import sqlite3
+
+from kismetanalyzer.diff import APPEARED, CHANGED, DISAPPEARED, UNCHANGED, diff_accesspoints, iter_accesspoints
+
+from conftest import DEVICE_COLUMNS
+
+
+def create_capture(path, aps):
+    """
+    Create a kismet-like database with the given access points (list of
+    tuples (mac, ssid, encryption, channel)) and one client.
+    """
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE devices ({0})".format(DEVICE_COLUMNS))
+    for mac, ssid, crypt, channel in aps:
+        dev = {
+            "kismet.device.base.macaddr": mac,
+            "kismet.device.base.name": ssid,
+            "kismet.device.base.type": "Wi-Fi AP",
+            "kismet.device.base.crypt": crypt,
+            "kismet.device.base.channel": channel,
+        }
+        db.execute("INSERT INTO devices (devmac, type, device) VALUES (?, ?, ?)", (mac, "Wi-Fi AP", json.dumps(dev)))
+    client = {"kismet.device.base.macaddr": "DA:00:00:00:00:01", "kismet.device.base.type": "Wi-Fi Client"}
+    db.execute("INSERT INTO devices (devmac, type, device) VALUES (?, ?, ?)",
+               ("DA:00:00:00:00:01", "Wi-Fi Client", json.dumps(client)))
+    db.commit()
+    return db
+
+
+def test_diff_accesspoints(tmp_path):
+    old_db = create_capture(str(tmp_path / "old.kismet"), [
+        ("00:00:00:00:00:01", "gone", "Open", "1"),
+        ("00:00:00:00:00:02", "same", "WPA2", "6"),
+        ("00:00:00:00:00:03", "old-ssid", "WPA2", "11"),
+        ("00:00:00:00:00:04", "crypt", "WEP", "11"),
+        ("00:00:00:00:00:05", "chan", "WPA2", "1"),
+        ("aa:bb:cc:dd:ee:ff", "lower", "WPA2", "36"),
+        ("FF:00:00:00:00:01", "gone-last", "Open", "1"),
+    ])
+    new_db = create_capture(str(tmp_path / "new.kismet"), [
+        ("00:00:00:00:00:00", "new-first", "Open", "1"),
+        ("00:00:00:00:00:02", "same", "WPA2", "6"),
+        ("00:00:00:00:00:03", "new-ssid", "WPA2", "11"),
+        ("00:00:00:00:00:04", "crypt", "WPA3", "11"),
+        ("00:00:00:00:00:05", "chan", "WPA2", "6"),
+        ("00:00:00:00:00:06", "new", "Open", "1"),
+        ("AA:BB:CC:DD:EE:FF", "lower", "WPA2", "36"),
+    ])
+
+    changes = list(diff_accesspoints(iter_accesspoints(old_db), iter_accesspoints(new_db)))
+    result = {}
+    for status, old_ap, new_ap, changed in changes:
+        ap = new_ap if new_ap is not None else old_ap
+        assert ap.mac.upper() not in result
+        result[ap.mac.upper()] = (status, changed)
+
+    assert result == {
+        "00:00:00:00:00:00": (APPEARED, []),
+        "00:00:00:00:00:01": (DISAPPEARED, []),
+        "00:00:00:00:00:02": (UNCHANGED, []),
+        "00:00:00:00:00:03": (CHANGED, ["ssid"]),
+        "00:00:00:00:00:04": (CHANGED, ["encryption"]),
+        "00:00:00:00:00:05": (CHANGED, ["channel"]),
+        "00:00:00:00:00:06": (APPEARED, []),
+        "AA:BB:CC:DD:EE:FF": (UNCHANGED, []),
+        "FF:00:00:00:00:01": (DISAPPEARED, []),
+    }
+    # the client is not compared
+    assert len(changes) == 9
+
+
+def test_diff_with_empty_capture(tmp_path):
+    aps = [("00:00:00:00:00:0{0}".format(i), "net{0}".format(i), "Open", "1") for i in range(3)]
+    db = create_capture(str(tmp_path / "aps.kismet"), aps)
+    empty = create_capture(str(tmp_path / "empty.kismet"), [])
+
+    appeared = list(diff_accesspoints(iter_accesspoints(empty), iter_accesspoints(db)))
+    assert [c[0] for c in appeared] == [APPEARED] * 3
+    assert [c[2].mac for c in appeared] == [mac for mac, _, _, _ in aps]
+    assert all(c[1] is None for c in appeared)
+
+    disappeared = list(diff_accesspoints(iter_accesspoints(db), iter_accesspoints(empty)))
+    assert [c[0] for c in disappeared] == [DISAPPEARED] * 3
+    assert all(c[2] is None for c in disappeared)
+
+    assert list(diff_accesspoints(iter_accesspoints(empty), iter_accesspoints(empty))) == []
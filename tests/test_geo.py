@@ -0,0 +1,212 @@
+import json
+import struct
+
+from kismetanalyzer import geo
+from kismetanalyzer.model import AccessPoint, Location
+
+
+COLUMNS = [
+    ("ssid", geo.STRING, lambda ap: ap.ssid),
+    ("channel", geo.INT, lambda ap: ap.channel),
+    ("signal", geo.DOUBLE, lambda ap: ap.signal),
+]
+
+
+def make_aps(num):
+    aps = []
+    for i in range(num):
+        loc = Location(8.0 + (i * 37 % 101) / 1000.0, 47.0 + (i * 53 % 97) / 1000.0, 0)
+        aps.append(AccessPoint(ssid="net{0}".format(i), mac="00:11:22:33:44:{0:02X}".format(i), location=loc,
+                               channel=i % 13 + 1, signal=-40.0 - i))
+    return aps
+
+
+# minimal FlatBuffers reader (independent of the encoder in geo.py)
+
+def _table(buf, pos):
+    vtable = pos - struct.unpack_from("<i", buf, pos)[0]
+    vsize = struct.unpack_from("<H", buf, vtable)[0]
+    return pos, vtable, vsize
+
+
+def _field(buf, table, index):
+    pos, vtable, vsize = table
+    if 4 + 2 * index >= vsize:
+        return None
+    offset = struct.unpack_from("<H", buf, vtable + 4 + 2 * index)[0]
+    return pos + offset if offset else None
+
+
+def _deref(buf, pos):
+    return pos + struct.unpack_from("<I", buf, pos)[0]
+
+
+def _scalar(buf, table, index, fmt, default=0):
+    pos = _field(buf, table, index)
+    return default if pos is None else struct.unpack_from(fmt, buf, pos)[0]
+
+
+def _vector(buf, table, index):
+    pos = _field(buf, table, index)
+    if pos is None:
+        return None
+    pos = _deref(buf, pos)
+    return struct.unpack_from("<I", buf, pos)[0], pos + 4
+
+
+def _string(buf, table, index):
+    length, start = _vector(buf, table, index)
+    return bytes(buf[start:start + length]).decode("utf-8")
+
+
+def _root(buf):
+    return _table(buf, _deref(buf, 0))
+
+
+def read_header(data):
+    assert data[:8] == b"fgb\x03fgb\x00"
+    size = struct.unpack_from("<I", data, 8)[0]
+    buf = data[12:12 + size]
+    root = _root(buf)
+    envelope = _vector(buf, root, 1)
+    if envelope is not None:
+        envelope = list(struct.unpack_from("<{0}d".format(envelope[0]), buf, envelope[1]))
+    columns = []
+    num, start = _vector(buf, root, 7)
+    for i in range(num):
+        column = _table(buf, _deref(buf, start + 4 * i))
+        columns.append((_string(buf, column, 0), _scalar(buf, column, 1, "<B")))
+    header = {
+        "title": _string(buf, root, 0),
+        "envelope": envelope,
+        "geometry_type": _scalar(buf, root, 2, "<B"),
+        "columns": columns,
+        "count": _scalar(buf, root, 8, "<Q"),
+        "node_size": _scalar(buf, root, 9, "<H", 16),
+        "crs": _scalar(buf, _table(buf, _deref(buf, _field(buf, root, 10))), 1, "<i"),
+    }
+    return header, 12 + size
+
+
+def read_feature(data, pos):
+    size = struct.unpack_from("<I", data, pos)[0]
+    buf = data[pos + 4:pos + 4 + size]
+    root = _root(buf)
+    geometry = _table(buf, _deref(buf, _field(buf, root, 0)))
+    num, start = _vector(buf, geometry, 1)
+    xy = struct.unpack_from("<{0}d".format(num), buf, start)
+
+    properties = {}
+    length, start = _vector(buf, root, 1)
+    end = start + length
+    while start < end:
+        index = struct.unpack_from("<H", buf, start)[0]
+        start += 2
+        name, type_ = COLUMNS[index][:2]
+        if type_ == geo.STRING:
+            n = struct.unpack_from("<I", buf, start)[0]
+            properties[name] = bytes(buf[start + 4:start + 4 + n]).decode("utf-8")
+            start += 4 + n
+        elif type_ == geo.DOUBLE:
+            properties[name] = struct.unpack_from("<d", buf, start)[0]
+            start += 8
+        else:
+            properties[name] = struct.unpack_from("<i", buf, start)[0]
+            start += 4
+    return xy, _scalar(buf, geometry, 6, "<B"), properties, 4 + size
+
+
+def level_sizes(count, node_size):
+    sizes = [count]
+    n = count
+    while n != 1:
+        n = (n + node_size - 1) // node_size
+        sizes.append(n)
+    return sizes
+
+
+def test_flatgeobuf_header_index_and_features(tmp_path):
+    aps = make_aps(40)
+    outfile = str(tmp_path / "aps.fgb")
+    assert geo.export_flatgeobuf(outfile, "aps", aps, COLUMNS, node_size=4) == 40
+
+    with open(outfile, "rb") as f:
+        data = f.read()
+
+    header, pos = read_header(data)
+    points = [geo.get_coordinates(ap) for ap in aps]
+    assert header["title"] == "aps"
+    assert header["count"] == 40
+    assert header["node_size"] == 4
+    assert header["geometry_type"] == 1
+    assert header["crs"] == 4326
+    assert header["columns"] == [(name, type_) for name, type_, _ in COLUMNS]
+    assert header["envelope"] == [min(p[0] for p in points), min(p[1] for p in points),
+                                  max(p[0] for p in points), max(p[1] for p in points)]
+
+    # packed R-tree: root first, the leaves are stored last
+    sizes = level_sizes(40, 4)
+    nodes = [struct.unpack_from("<4dQ", data, pos + 40 * i) for i in range(sum(sizes))]
+    features_start = pos + 40 * len(nodes)
+    leaves = nodes[-40:]
+    assert nodes[0][:4] == tuple(header["envelope"])
+
+    # each leaf points to the feature at its position
+    offset = 0
+    expected = dict((ap.ssid, ap) for ap in aps)
+    for leaf in leaves:
+        assert leaf[4] == offset
+        xy, geometry_type, properties, size = read_feature(data, features_start + offset)
+        assert geometry_type == 1
+        assert leaf[:4] == (xy[0], xy[1], xy[0], xy[1])
+        ap = expected.pop(properties["ssid"])
+        assert xy == geo.get_coordinates(ap)
+        assert properties == {"ssid": ap.ssid, "channel": ap.channel, "signal": ap.signal}
+        offset += size
+    assert not expected
+    assert features_start + offset == len(data)
+
+    # each parent node covers the boxes of its children, the offset is the
+    # index of its first child
+    end = len(nodes)
+    for level in range(len(sizes) - 1):
+        start = end - sizes[level]
+        parents = nodes[start - sizes[level + 1]:start]
+        for i, parent in enumerate(parents):
+            children = nodes[start + i * 4:min(start + (i + 1) * 4, end)]
+            assert parent[4] == start + i * 4
+            assert parent[0] == min(c[0] for c in children)
+            assert parent[1] == min(c[1] for c in children)
+            assert parent[2] == max(c[2] for c in children)
+            assert parent[3] == max(c[3] for c in children)
+        end = start
+
+
+def test_flatgeobuf_without_features(tmp_path):
+    outfile = str(tmp_path / "empty.fgb")
+    assert geo.export_flatgeobuf(outfile, "empty", [], COLUMNS) == 0
+
+    with open(outfile, "rb") as f:
+        data = f.read()
+
+    header, pos = read_header(data)
+    assert header["count"] == 0
+    assert header["envelope"] is None
+    assert header["node_size"] == 0
+    # neither index nor features
+    assert pos == len(data)
+
+
+def test_geojsonseq_records(tmp_path):
+    aps = make_aps(5)
+    outfile = str(tmp_path / "aps.geojsonseq")
+    assert geo.export_geojsonseq(outfile, aps, COLUMNS) == 5
+
+    with open(outfile, "rb") as f:
+        records = f.read().split(b"\n")
+    assert records[-1] == b""
+    for ap, record in zip(aps, records[:-1]):
+        assert record.startswith(b"\x1e")
+        feature = json.loads(record[1:].decode("utf-8"))
+        assert feature["geometry"] == {"type": "Point", "coordinates": list(geo.get_coordinates(ap))}
+        assert feature["properties"] == {"ssid": ap.ssid, "channel": ap.channel, "signal": ap.signal}
@@ -0,0 +1,88 @@
+import struct
+
+import pytest
+
+from kismetanalyzer.oui import HEADER, LOCALLY_ADMINISTERED, OUIDatabase, build_database
+
+
+def write_registry(path, rows):
+    with open(path, "w") as f:
+        f.write("Registry,Assignment,Organization Name,Organization Address\n")
+        for registry, assignment, name in rows:
+            f.write('{0},{1},"{2}",Somewhere\n'.format(registry, assignment, name))
+    return path
+
+
+@pytest.fixture
+def ouidb(tmp_path):
+    files = [
+        write_registry(str(tmp_path / "oui.csv"), [
+            ("MA-L", "001122", "Large Corp"),
+            ("MA-L", "00AABB", "Other Corp"),
+            ("MA-L", "FCFFFF", "Last Corp"),
+            ("MA-L", "12345", "Invalid Length"),
+        ]),
+        write_registry(str(tmp_path / "mam.csv"), [("MA-M", "0011223", "Medium Corp")]),
+        write_registry(str(tmp_path / "oui36.csv"), [("MA-S", "001122334", "Small Corp")]),
+    ]
+    filename = str(tmp_path / "oui.bin")
+    assert build_database(filename, files) == 5
+    db = OUIDatabase(filename)
+    yield db
+    db.close()
+
+
+def test_longest_prefix_wins(ouidb):
+    assert ouidb.lookup("00:11:22:33:44:55") == "Small Corp"
+    assert ouidb.lookup("00:11:22:35:44:55") == "Medium Corp"
+    assert ouidb.lookup("00:11:22:45:44:55") == "Large Corp"
+    assert ouidb.lookup("00-aa-bb-00-00-01") == "Other Corp"
+    assert ouidb.lookup("FC:FF:FF:FF:FF:FF") == "Last Corp"
+    assert ouidb.lookup("00:00:00:00:00:01") is None
+    assert ouidb.lookup("FF:FF:FF:FF:FF:FF") is None
+
+
+def test_resolve(ouidb):
+    assert ouidb.resolve("00:11:22:33:44:55") == "Small Corp"
+    assert ouidb.resolve("00:00:00:00:00:01", "Kismet") == "Kismet"
+    # locally administered (randomized) MACs have no manufacturer
+    assert ouidb.resolve("02:11:22:33:44:55") == LOCALLY_ADMINISTERED
+    assert ouidb.resolve("DA:A1:19:00:11:22", "Kismet") == LOCALLY_ADMINISTERED
+
+
+def test_malformed_macs(ouidb):
+    for mac in ("", "00:11", "zz:11:22:33:44:55", "not a mac"):
+        assert ouidb.lookup(mac) is None
+        assert ouidb.resolve(mac, "Unknown") == "Unknown"
+
+
+def test_sections_are_aligned(tmp_path, ouidb):
+    with open(str(tmp_path / "oui.bin"), "rb") as f:
+        values = HEADER.unpack(f.read(HEADER.size))
+    assert HEADER.size % 8 == 0
+    for i in range(3):
+        assert values[1 + 2 * i] % 8 == 0
+
+
+def test_empty_sections(tmp_path):
+    files = [write_registry(str(tmp_path / "oui.csv"), [("MA-L", "001122", "Large Corp")])]
+    filename = str(tmp_path / "oui.bin")
+    assert build_database(filename, files) == 1
+    db = OUIDatabase(filename)
+    assert db.lookup("00:11:22:33:44:55") == "Large Corp"
+    assert db.lookup("00:11:23:33:44:55") is None
+    db.close()
+
+    # no registries at all
+    assert build_database(filename, []) == 0
+    db = OUIDatabase(filename)
+    assert db.lookup("00:11:22:33:44:55") is None
+    db.close()
+
+
+def test_invalid_database(tmp_path):
+    filename = str(tmp_path / "invalid.bin")
+    with open(filename, "wb") as f:
+        f.write(struct.pack("<8s7I4x", b"INVALID\x00", 0, 0, 0, 0, 0, 0, 0))
+    with pytest.raises(ValueError):
+        OUIDatabase(filename)
@@ -0,0 +1,62 @@
+import csv
+import json
+
+from kismetanalyzer import geo
+from kismetanalyzer.model import AccessPoint, Location
+from kismetanalyzer.partition import UNKNOWN, export_partitioned, geohash_encode, parse_partition
+
+
+HEADER = ["MAC-Address", "Channel"]
+
+
+def get_row(ap):
+    return [ap.mac, ap.channel]
+
+
+def make_aps():
+    # channels which are mapped to the same filename, interleaved so that
+    # the files are closed and reopened (max_open=1)
+    channels = ["6HT40+", "6HT40_", "6ht40_", "11", ""]
+    aps = []
+    for i in range(50):
+        if i % 7 == 0:
+            loc = Location()
+        else:
+            loc = Location(8.0 + i / 100.0, 47.0 - i / 100.0, 0)
+        aps.append(AccessPoint(mac="00:00:00:00:00:{0:02X}".format(i), channel=channels[i % len(channels)],
+                               location=loc))
+    return aps
+
+
+def test_partitions_with_the_same_filename(tmp_path):
+    aps = make_aps()
+    prefix = str(tmp_path / "out-aplist")
+    key = parse_partition("channel", ["channel"])
+    rows, num_shards, manifest = export_partitioned(prefix, aps, HEADER, get_row, "channel", key, max_open=1)
+
+    assert rows == 50
+    assert num_shards == 5
+    with open(manifest) as f:
+        manifest = json.load(f)
+    assert manifest["rows"] == 50
+    assert len(set(s["file"].lower() for s in manifest["shards"])) == 5
+
+    for shard in manifest["shards"]:
+        expected = [ap for ap in aps if key(ap) == shard["partition"]]
+        with open(shard["file"]) as f:
+            content = list(csv.reader(f, delimiter=";"))
+        # the header is only written once
+        assert content[0] == HEADER
+        assert content[1:] == [[ap.mac, ap.channel] for ap in expected]
+        assert shard["rows"] == len(expected)
+
+        points = [geo.get_coordinates(ap) for ap in expected if geo.get_coordinates(ap) != (0.0, 0.0)]
+        assert shard["bbox"] == [min(p[0] for p in points), min(p[1] for p in points),
+                                 max(p[0] for p in points), max(p[1] for p in points)]
+
+    assert UNKNOWN in [s["partition"] for s in manifest["shards"]]
+
+
+def test_geohash():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash_encode(-25.382708, -49.265506, 5) == "6gkzw"
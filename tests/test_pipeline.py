@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from kismetanalyzer.pipeline import Pipeline
+
+
+def run_with_timeout(pipeline, timeout=10):
+    # run the pipeline in a thread, so a hanging pipeline fails the test
+    errors = []
+
+    def target():
+        try:
+            pipeline.run()
+        except Exception as e:
+            errors.append(e)
+
+    t = threading.Thread(target=target)
+    t.daemon = True
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "the pipeline did not return"
+    return errors[0] if errors else None
+
+
+def test_all_objects_reach_all_consumers():
+    results = [[], []]
+    consumers = [lambda items: results[0].extend(items), lambda items: results[1].extend(items)]
+    decode = lambda row: None if row % 10 == 0 else row * 2
+    pipeline = Pipeline(lambda: iter(range(1000)), decode, consumers, queue_size=2, batch_size=7)
+    assert run_with_timeout(pipeline) is None
+    expected = [row * 2 for row in range(1000) if row % 10 != 0]
+    assert results == [expected, expected]
+
+
+def test_failing_consumer_stops_the_pipeline():
+    read = []
+
+    def failing(items):
+        for num, _ in enumerate(items):
+            if num == 50:
+                raise RuntimeError("export failed")
+
+    def reading(items):
+        for obj in items:
+            read.append(obj)
+            time.sleep(0.001)
+
+    pipeline = Pipeline(lambda: iter(range(100000)), lambda row: row, [failing, reading],
+                        queue_size=2, batch_size=10)
+    error = run_with_timeout(pipeline)
+    assert isinstance(error, RuntimeError)
+    assert str(error) == "export failed"
+    assert len(read) < 100000
+
+
+def test_failing_decode_stops_the_pipeline():
+    def decode(row):
+        if row == 500:
+            raise ValueError("invalid row")
+        return row
+
+    pipeline = Pipeline(lambda: iter(range(100000)), decode, [lambda items: list(items)],
+                        queue_size=2, batch_size=10)
+    error = run_with_timeout(pipeline)
+    assert isinstance(error, ValueError)
+
+
+def test_consumer_which_returns_early():
+    first = []
+    rest = []
+
+    def head(items):
+        for obj in items:
+            first.append(obj)
+            if len(first) == 5:
+                return
+
+    pipeline = Pipeline(lambda: iter(range(10000)), lambda row: row, [head, lambda items: rest.extend(items)],
+                        queue_size=2, batch_size=10)
+    assert run_with_timeout(pipeline) is None
+    assert first == list(range(5))
+    assert rest == list(range(10000))
+
+
+@pytest.mark.parametrize("queue_size", [1, 3])
+def test_slow_consumer_applies_backpressure(queue_size):
+    batch_size = 10
+    fetched = [0]
+    max_depth = [0]
+    max_ahead = [0]
+
+    def fetch():
+        for row in range(3000):
+            fetched[0] += 1
+            yield row
+
+    def slow(items):
+        for num, _ in enumerate(items, 1):
+            if num % batch_size == 0:
+                time.sleep(0.002)
+            max_depth[0] = max([max_depth[0]] + [q.qsize() for q in queues])
+            max_ahead[0] = max(max_ahead[0], fetched[0] - num)
+
+    pipeline = Pipeline(fetch, lambda row: row, [slow], queue_size=queue_size, batch_size=batch_size)
+    queues = [pipeline._rows] + pipeline._outputs
+    assert run_with_timeout(pipeline) is None
+    assert max_depth[0] <= queue_size
+    # both queues are full, one batch is decoded, one is fetched and one is
+    # consumed at most
+    assert max_ahead[0] <= (2 * queue_size + 3) * batch_size
@@ -0,0 +1,54 @@
+import glob
+import os
+import random
+import tempfile
+
+import pytest
+
+from kismetanalyzer.model import AccessPoint
+from kismetanalyzer.sorting import ExternalSort, SORT_KEYS, sort_devices
+
+
+def make_aps(num, seed=1):
+    rnd = random.Random(seed)
+    return [AccessPoint(ssid="ap{0}".format(i), mac="{0:012X}".format(i), signal=-rnd.randint(20, 90),
+                        client_map=[]) for i in range(num)]
+
+
+def sort_files():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), "kismetanalyzer-sort-*")))
+
+
+def test_external_sort_with_multi_pass_merge():
+    aps = make_aps(1000)
+    before = sort_files()
+    devs = sort_devices(aps, "signal", buffer_size=10, max_fan_in=4)
+    try:
+        assert isinstance(devs, ExternalSort)
+        # 100 runs are merged into at most 4 runs
+        assert len(sort_files() - before) <= 4
+        expected = [ap.mac for ap in sorted(aps, key=SORT_KEYS["signal"])]
+        assert [ap.mac for ap in devs] == expected
+        # the result can be iterated again
+        assert [ap.mac for ap in devs] == expected
+    finally:
+        devs.close()
+    assert sort_files() == before
+
+
+def test_external_sort_removes_runs_on_error():
+    def failing():
+        for ap in make_aps(100):
+            yield ap
+        raise RuntimeError("read error")
+
+    before = sort_files()
+    with pytest.raises(RuntimeError):
+        ExternalSort(failing(), SORT_KEYS["signal"], buffer_size=10)
+    assert sort_files() == before
+
+
+def test_top_n():
+    aps = make_aps(500)
+    top = sort_devices(aps, "signal", top=10)
+    assert [ap.mac for ap in top] == [ap.mac for ap in sorted(aps, key=SORT_KEYS["signal"])[:10]]
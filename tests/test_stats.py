@@ -0,0 +1,123 @@
+import json
+import random
+from collections import Counter
+
+from kismetanalyzer.sketches import HyperLogLog, sample_error
+from kismetanalyzer.stats import collect_approx_stats, collect_stats
+
+from conftest import create_kismet
+
+
+# statistics which are estimated by extrapolating the counts of the sample
+SAMPLED = ["devices_by_type", "devices_by_phyname", "aps_by_encryption", "channels", "frequencies"]
+
+
+def test_collect_stats(kismet_db):
+    stats = collect_stats(kismet_db)
+    assert stats["devices_by_type"] == {"Wi-Fi AP": 300, "Wi-Fi Client": 600}
+    assert stats["devices_by_phyname"] == {"IEEE802.11": 900}
+    assert sum(stats["aps_by_encryption"].values()) == 300
+    assert sum(stats["manufacturers"].values()) == 900
+    assert stats["channels"]["6"] >= 600
+
+
+def test_approx_stats_are_exact_if_the_sample_covers_the_table(kismet_db):
+    exact = collect_stats(kismet_db)
+    approx = collect_approx_stats(kismet_db, sample_size=100000, seed=1)
+
+    for name in SAMPLED:
+        assert dict((value, round(estimate)) for value, estimate, _ in approx[name]) == dict(exact[name])
+        assert all(error == 0 for _, _, error in approx[name])
+    totals = dict((name, (estimate, error)) for name, estimate, error in approx["totals"])
+    assert totals["devices"] == (900, 0)
+    assert totals["packets"] == (6000, 0)
+
+
+def get_aps_per_ssid(db):
+    counts = Counter()
+    for row in db.execute("SELECT device FROM devices WHERE type = 'Wi-Fi AP'"):
+        counts[json.loads(row[0])["kismet.device.base.name"]] += 1
+    return counts
+
+
+def test_approx_error_bounds_cover_the_exact_values(kismet_db):
+    exact = collect_stats(kismet_db)
+    exact["aps_per_ssid"] = get_aps_per_ssid(kismet_db)
+    covered = 0
+    total = 0
+    for seed in range(20):
+        approx = collect_approx_stats(kismet_db, sample_size=200, seed=seed)
+        for name in SAMPLED:
+            estimates = dict((value, (estimate, error)) for value, estimate, error in approx[name])
+            for value, count in exact[name].items():
+                estimate, error = estimates.get(value, (0.0, 0.0))
+                total += 1
+                if abs(estimate - count) <= error:
+                    covered += 1
+        # count-min sketches never undercount the sample, the bound
+        # includes the sampling error and the overcount of the sketch
+        for name in ("manufacturers", "aps_per_ssid"):
+            assert approx[name]
+            for value, estimate, error in approx[name]:
+                total += 1
+                if abs(estimate - exact[name][value]) <= error:
+                    covered += 1
+
+    # 95% intervals (values which are missing in a sample count as miss)
+    assert float(covered) / total >= 0.85
+
+
+def test_distinct_macs_of_the_sample(tmp_path):
+    for seed in range(3):
+        db = create_kismet(str(tmp_path / "{0}.kismet".format(seed)), num_aps=200 * (seed + 1), seed=seed)
+        clients = set()
+        for row in db.execute("SELECT device FROM devices WHERE type = 'Wi-Fi AP'"):
+            clients.update(json.loads(row[0])["dot11.device"]["dot11.device.associated_client_map"])
+        sources = set(row[0] for row in db.execute("SELECT sourcemac FROM packets"))
+
+        # the sample covers both tables, so the sketches see all MACs
+        approx = collect_approx_stats(db, sample_size=1000000, seed=seed)
+        sample_only = dict((name, (estimate, error)) for name, estimate, error in approx["sample_only"])
+        estimate, error = sample_only["distinct_clients_of_sampled_aps"]
+        assert abs(estimate - len(clients)) <= error
+        estimate, error = sample_only["distinct_sources_of_sampled_packets"]
+        assert abs(estimate - len(sources)) <= error
+        assert "distinct_clients_of_sampled_aps" not in dict((t[0], t) for t in approx["totals"])
+        db.close()
+
+
+def test_hyperloglog_error_bounds_cover_the_exact_values():
+    covered = 0
+    total = 0
+    for seed in range(5):
+        rnd = random.Random(seed)
+        for num in (100, 1000, 10000, 100000):
+            hll = HyperLogLog()
+            values = set()
+            for _ in range(num):
+                value = rnd.getrandbits(48)
+                values.add(value)
+                hll.add(value)
+                # duplicates don't change the estimate
+                hll.add(value)
+            total += 1
+            if abs(hll.estimate() - len(values)) <= hll.error():
+                covered += 1
+    assert float(covered) / total >= 0.85
+
+
+def test_approx_stats_only_read_the_sample(kismet_db):
+    statements = []
+    kismet_db.set_trace_callback(statements.append)
+    collect_approx_stats(kismet_db, sample_size=100, seed=1)
+    kismet_db.set_trace_callback(None)
+
+    for sql in statements:
+        if "FROM devices" in sql or "FROM packets" in sql:
+            assert "rowid IN" in sql or "MIN(rowid)" in sql, sql
+
+
+def test_sample_error_finite_population_correction():
+    assert sample_error(50, 100, 1.0) == 0.0
+    assert sample_error(50, 100, 10.0) > 0.0
+    assert sample_error(50, 100, 10.0) < sample_error(50, 100, 1000.0) / 100.0
@@ -0,0 +1,74 @@
+import sqlite3
+
+from kismetanalyzer.watch import Ledger
+
+
+def test_ledger_done():
+    ledger = Ledger(":memory:")
+    assert not ledger.is_processed("/a.kismet", 100, 1.0, now=0)
+    assert ledger.record("/a.kismet", 100, 1.0, "done", 0, 0, 10) == 1
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=10)
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=1000000)
+    # a replaced file is processed again
+    assert not ledger.is_processed("/a.kismet", 200, 1.0, now=10)
+    assert not ledger.is_processed("/a.kismet", 100, 2.0, now=10)
+
+
+def test_ledger_retries_with_backoff():
+    ledger = Ledger(":memory:", max_attempts=4, retry_delay=60)
+
+    assert ledger.record("/a.kismet", 100, 1.0, "failed", 0, 0, 1000, "error") == 1
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=1059)
+    assert not ledger.is_processed("/a.kismet", 100, 1.0, now=1060)
+
+    # the delay doubles after each attempt
+    assert ledger.record("/a.kismet", 100, 1.0, "failed", 0, 0, 2000, "error") == 2
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=2119)
+    assert not ledger.is_processed("/a.kismet", 100, 1.0, now=2120)
+
+    assert ledger.record("/a.kismet", 100, 1.0, "failed", 0, 0, 3000, "error") == 3
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=3239)
+    assert not ledger.is_processed("/a.kismet", 100, 1.0, now=3240)
+
+    # the file is not retried after max_attempts
+    assert ledger.record("/a.kismet", 100, 1.0, "failed", 0, 0, 4000, "error") == 4
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=4000 + 10 ** 9)
+
+
+def test_ledger_replaced_file_resets_attempts():
+    ledger = Ledger(":memory:", max_attempts=2, retry_delay=60)
+    ledger.record("/a.kismet", 100, 1.0, "failed", 0, 0, 1000, "error")
+    ledger.record("/a.kismet", 100, 1.0, "failed", 0, 0, 2000, "error")
+    assert ledger.is_processed("/a.kismet", 100, 1.0, now=10 ** 9)
+
+    assert not ledger.is_processed("/a.kismet", 150, 5.0, now=2001)
+    assert ledger.record("/a.kismet", 150, 5.0, "failed", 0, 0, 3000, "error") == 1
+    assert not ledger.is_processed("/a.kismet", 150, 5.0, now=3060)
+
+    # a successful attempt after failures
+    assert ledger.record("/a.kismet", 150, 5.0, "done", 0, 0, 3100) == 2
+    assert ledger.is_processed("/a.kismet", 150, 5.0, now=3100)
+
+
+def test_ledger_migrates_old_ledgers(tmp_path):
+    filename = str(tmp_path / "ledger.db")
+    db = sqlite3.connect(filename)
+    db.execute("CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, status TEXT, detected REAL, "
+               "started REAL, finished REAL, error TEXT)")
+    db.execute("INSERT INTO files VALUES ('/done.kismet', 100, 1.0, 'done', 0, 0, 10, NULL)")
+    db.execute("INSERT INTO files VALUES ('/failed.kismet', 100, 1.0, 'failed', 0, 0, 1000, 'error')")
+    db.commit()
+    db.close()
+
+    ledger = Ledger(filename, max_attempts=3, retry_delay=60)
+    assert ledger.is_processed("/done.kismet", 100, 1.0, now=10)
+    # the failed file counts as one attempt
+    assert ledger.is_processed("/failed.kismet", 100, 1.0, now=1059)
+    assert not ledger.is_processed("/failed.kismet", 100, 1.0, now=1060)
+    assert ledger.record("/failed.kismet", 100, 1.0, "failed", 0, 0, 1060, "error") == 2
+    ledger.close()
+
+    # the migration is only done once
+    ledger = Ledger(filename)
+    assert ledger.is_processed("/failed.kismet", 100, 1.0, now=1060)
+    ledger.close()